@@ -0,0 +1,8 @@
+""" Template Context Processors """
+
+from . import util
+
+
+def sidebar(request):  # pylint: disable=unused-argument
+    """ Cached sidebar fragment for every encyclopedia page """
+    return {"sidebar": util.sidebar_html()}
@@ -0,0 +1,29 @@
+""" Dump the database backend back out to .md files """
+
+import os
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia.models import Entry
+from encyclopedia.storage import decompress
+
+
+class Command(BaseCommand):
+    """ python manage.py export_entries [dest] """
+    help = "Export every row of the Entry table to a directory of .md files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dest", nargs="?", default="entries",
+                            help="Directory to write Markdown entries to (default: entries)")
+
+    def handle(self, *args, **options):
+        dest = options["dest"]
+        os.makedirs(dest, exist_ok=True)
+
+        count = 0
+        for title, content in Entry.objects.values_list("title", "content").iterator():
+            with open(os.path.join(dest, f"{title}.md"), "w", encoding="utf-8") as file:
+                file.write(decompress(content))
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} entries to {dest}"))
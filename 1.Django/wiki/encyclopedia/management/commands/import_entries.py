@@ -0,0 +1,46 @@
+""" Bulk load .md entries into the database backend """
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia.models import Entry
+from encyclopedia.storage import compress
+
+
+class Command(BaseCommand):
+    """ python manage.py import_entries [source] """
+    help = "Import every .md file in a directory into the Entry table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", nargs="?", default="entries",
+                            help="Directory of Markdown entries (default: entries)")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        source = options["source"]
+        if not os.path.isdir(source):
+            raise CommandError(f"{source} is not a directory")
+
+        filenames = sorted(name for name in os.listdir(source) if name.endswith(".md"))
+        size = options["batch_size"]
+        created = updated = 0
+
+        for start in range(0, len(filenames), size):
+            batch = {}
+            for filename in filenames[start:start + size]:
+                with open(os.path.join(source, filename), encoding="utf-8") as file:
+                    batch[filename[:-len(".md")]] = compress(file.read())
+
+            # Replace the rows that already exist, insert the rest
+            existing = Entry.objects.in_bulk(list(batch), field_name="title")
+            for title, entry in existing.items():
+                entry.content = batch.pop(title)
+            Entry.objects.bulk_update(list(existing.values()), ["content"])
+            Entry.objects.bulk_create([Entry(title=title, content=content)
+                                       for title, content in batch.items()])
+            created += len(batch)
+            updated += len(existing)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} new and {updated} existing entries from {source}"))
@@ -1,3 +1,13 @@
+""" Database Models """
+
 from django.db import models
 
-# Create your models here.
+
+class Entry(models.Model):
+    """ Wiki entry for the database storage backend """
+    title = models.CharField(max_length=255, unique=True)
+    content = models.BinaryField()
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.title}"
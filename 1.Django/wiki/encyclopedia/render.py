@@ -0,0 +1,279 @@
+""" Rendered HTML Cache """
+
+import os
+import re
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from markdown2 import markdown
+
+
+DEFAULT_MEMORY_BYTES = 16 * 1024 * 1024
+DEFAULT_DISK_BYTES = 256 * 1024 * 1024
+
+# Pruning stops at this fraction of the disk budget, so it runs again only
+# after a tenth of the budget has been written
+DISK_LOW_WATER = 0.9
+
+
+def content_hash(content):
+    """ Stable hash of an entry's Markdown source """
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    Two-tier cache of Markdown -> HTML conversions
+    Memory tier is an LRU bounded by total HTML size in bytes,
+    one slot per title; disk tier is keyed by content hash so it
+    survives restarts and is shared by every worker on the node,
+    and is kept under its own byte budget by file mtime
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()
+        self._size = 0
+        # (directory, bytes) - this worker's running total of the disk tier,
+        # seeded by one walk and corrected by every prune
+        self._disk_size = (None, 0)
+        self._prune_lock = threading.Lock()
+
+    @staticmethod
+    def _budget():
+        return getattr(settings, "WIKI_RENDER_CACHE_BYTES", DEFAULT_MEMORY_BYTES)
+
+    @staticmethod
+    def _disk_budget():
+        return getattr(settings, "WIKI_RENDER_CACHE_DISK_BYTES", DEFAULT_DISK_BYTES)
+
+    @staticmethod
+    def _disk_dir():
+        return getattr(settings, "WIKI_RENDER_CACHE_DIR", None)
+
+    def _disk_path(self, digest):
+        directory = self._disk_dir()
+        if not directory:
+            return None
+        return os.path.join(directory, digest[:2], f"{digest}.html")
+
+    def _remember(self, title, digest, html):
+        """ Put into the memory tier and evict least recently used slots """
+        size = len(html.encode("utf-8"))
+        with self._lock:
+            old = self._slots.pop(title, None)
+            if old is not None:
+                self._size -= old[2]
+            if size > self._budget():
+                return
+            self._slots[title] = (digest, html, size)
+            self._size += size
+            while self._size > self._budget():
+                _, (_, _, evicted) = self._slots.popitem(last=False)
+                self._size -= evicted
+
+    def _read_disk(self, digest):
+        path = self._disk_path(digest)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding="utf-8") as file:
+                html = file.read()
+        except FileNotFoundError:
+            return None
+        # Mark as recently used so pruning takes older files first
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return html
+
+    def _write_disk(self, digest, html):
+        path = self._disk_path(digest)
+        if path is None:
+            return
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write beside the target and rename so readers never see half a file
+        fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as output:
+                output.write(html)
+            os.replace(temp, path)
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+            return
+        if self._track_disk(len(html.encode("utf-8"))) > self._disk_budget():
+            self._prune_disk()
+
+    def _track_disk(self, delta):
+        """ Add delta bytes to the disk tier total, returns the new total """
+        directory = self._disk_dir()
+        if self._disk_size[0] != directory:
+            # First change seen here, the walk already counts it
+            total = sum(size for _, size, _ in self._disk_files())
+            with self._lock:
+                self._disk_size = (directory, total)
+                return total
+        with self._lock:
+            self._disk_size = (directory, max(self._disk_size[1] + delta, 0))
+            return self._disk_size[1]
+
+    def _disk_files(self):
+        """ (mtime, size, path) of every rendered file in the disk tier """
+        files = []
+        for root, _, names in os.walk(self._disk_dir()):
+            for name in names:
+                if not name.endswith(".html"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime_ns, stat.st_size, path))
+        return files
+
+    def _prune_disk(self):
+        """
+        Delete least recently used files until the disk tier is back under
+        DISK_LOW_WATER of its budget; one walk, then the total is exact again
+        Old renders of edited entries are never looked up again and go first
+        """
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            files = self._disk_files()
+            total = sum(size for _, size, _ in files)
+            target = self._disk_budget() * DISK_LOW_WATER
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            with self._lock:
+                self._disk_size = (self._disk_dir(), total)
+        finally:
+            self._prune_lock.release()
+
+    def get(self, title, content):
+        """ HTML for this title/content pair, converting only on a miss """
+        digest = content_hash(content)
+        with self._lock:
+            slot = self._slots.get(title)
+            if slot is not None and slot[0] == digest:
+                self._slots.move_to_end(title)
+                return slot[1]
+
+        html = self._read_disk(digest)
+        if html is None:
+            html = markdown(content)
+            self._write_disk(digest, html)
+        self._remember(title, digest, html)
+        return html
+
+    def invalidate(self, title):
+        """ Forget a title whose content has changed """
+        with self._lock:
+            slot = self._slots.pop(title, None)
+            if slot is None:
+                return
+            self._size -= slot[2]
+        path = self._disk_path(slot[0])
+        if path is None:
+            return
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self._track_disk(-size)
+
+    def clear(self):
+        """ Empty the memory tier """
+        with self._lock:
+            self._slots.clear()
+            self._size = 0
+
+
+_cache = RenderCache()
+
+
+def render_entry(title, content):
+    """
+    Returns the HTML for an entry's Markdown content, served from
+    cache whenever the content has not changed since last render.
+    """
+    return _cache.get(title, content)
+
+
+# An unindented line opening a raw HTML block, and a list item marker
+HTML_BLOCK_OPEN = re.compile(
+    r"<(address|article|aside|blockquote|details|div|dl|fieldset|figure|footer|form"
+    r"|h[1-6]|header|nav|ol|p|pre|section|table|ul)[\s>]", re.IGNORECASE)
+LIST_ITEM = re.compile(r"([*+-]|\d+[.)])\s")
+
+
+def iter_blocks(lines):
+    """
+    Groups Markdown lines into blocks split at blank lines, never
+    inside a fenced code block or a raw HTML block, between the
+    items of a list or before an indented continuation
+    """
+    block = []
+    fence = None
+    html = None
+    in_list = False
+    after_blank = False
+    for line in lines:
+        stripped = line.lstrip()
+        top_level = stripped and not line[:1].isspace()
+        if after_blank and top_level and not (in_list and LIST_ITEM.match(line)):
+            yield "".join(block)
+            block = []
+        after_blank = False
+        if top_level and fence is None and html is None:
+            in_list = bool(LIST_ITEM.match(line))
+
+        if fence is None and html is None and stripped.startswith(("```", "~~~")):
+            fence = stripped[:3]
+        elif fence is not None and stripped.startswith(fence):
+            fence = None
+        elif fence is None and html is None and top_level and HTML_BLOCK_OPEN.match(line):
+            tag = HTML_BLOCK_OPEN.match(line).group(1).lower()
+            if f"</{tag}>" not in line.lower():
+                html = tag
+        elif html is not None and f"</{html}>" in line.lower():
+            html = None
+        elif fence is None and html is None and not stripped and block:
+            after_blank = True
+        block.append(line)
+    if block:
+        yield "".join(block)
+
+
+def iter_rendered(lines):
+    """
+    Converts Markdown to HTML one block at a time so a large entry
+    is never held in memory whole. Reference-style links must be
+    defined in the same block that uses them, and a raw HTML block
+    must close with the same tag it opened with, nested blocks of
+    that tag are not counted.
+    """
+    for block in iter_blocks(lines):
+        if block.strip():
+            yield markdown(block)
+
+
+def invalidate(title):
+    """
+    Drops any cached HTML for title. Called by util.save_entry.
+    """
+    _cache.invalidate(title)
@@ -0,0 +1,336 @@
+""" Full-Text Search """
+
+import os
+import re
+import gzip
+import json
+import math
+import heapq
+import bisect
+import tempfile
+import threading
+
+from django.conf import settings
+
+from . import util
+
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# A title word counts as this many body words
+TITLE_WEIGHT = 3
+
+# Prefix matches score less than exact term matches
+PREFIX_WEIGHT = 0.5
+MAX_PREFIX_TERMS = 64
+
+FORMAT_VERSION = 1
+
+# The save log is folded into a fresh snapshot once it grows past this
+DEFAULT_LOG_BYTES = 256 * 1024
+
+
+def tokenize(text):
+    """ Split text into casefolded word tokens """
+    return re.findall(r"\w+", text.casefold())
+
+
+class SearchIndex:
+    """
+    Inverted index over entry titles and bodies, ranked with BM25
+    Postings map term -> {doc id: weighted term frequency};
+    vocab is kept sorted so prefix lookups are a bisect away
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+        self._loaded = False
+        self._dirty = False
+
+    def _clear(self):
+        self._titles = []
+        self._ids = {}
+        self._lengths = []
+        self._terms = []
+        self._postings = {}
+        self._vocab = []
+        self._total_length = 0
+        self._count = 0
+        self._stamp = None
+
+    @staticmethod
+    def _path():
+        return getattr(settings, "WIKI_SEARCH_INDEX_PATH", None)
+
+    @classmethod
+    def _log_path(cls):
+        path = cls._path()
+        return f"{path}.log" if path else None
+
+    # Building and maintenance
+    def _add(self, title, content):
+        counts = {}
+        for term in tokenize(title):
+            counts[term] = counts.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(content):
+            counts[term] = counts.get(term, 0) + 1
+
+        doc = self._ids.get(title)
+        if doc is None:
+            doc = len(self._titles)
+            self._titles.append(title)
+            self._lengths.append(0)
+            self._terms.append(())
+            self._ids[title] = doc
+        if counts:
+            self._count += 1
+
+        length = sum(counts.values())
+        self._lengths[doc] = length
+        self._terms[doc] = tuple(counts)
+        self._total_length += length
+        for term, freq in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._vocab, term)
+            postings[doc] = freq
+
+    def _remove(self, title):
+        doc = self._ids.get(title)
+        if doc is None or not self._terms[doc]:
+            return
+        for term in self._terms[doc]:
+            postings = self._postings[term]
+            del postings[doc]
+            if not postings:
+                del self._postings[term]
+                del self._vocab[bisect.bisect_left(self._vocab, term)]
+        self._total_length -= self._lengths[doc]
+        self._count -= 1
+        self._lengths[doc] = 0
+        # The id slot is kept so the title maps back to it on re-add
+        self._terms[doc] = ()
+
+    def rebuild(self):
+        """ Index every entry from scratch and persist the result """
+        with self._lock:
+            self._clear()
+            self._stamp = util.entries_version()
+            for title in util.list_entries():
+                content = util.get_entry(title)
+                if content is not None:
+                    self._add(title, content)
+            self._loaded = True
+            self._dirty = True
+            self.persist()
+
+    def update(self, title, content, previous=None):
+        """
+        Re-index a single entry after it has been written
+        previous is the entries version from just before the write, so a
+        persisted index that was current until now can still be used;
+        the caller holds the backend's writer lock, so the version after
+        the write covers this entry and nothing else
+        """
+        with self._lock:
+            if not self._loaded or self._stamp not in (previous, util.entries_version()):
+                if not (self._loaded and self._replay(previous)) and not self._load(previous):
+                    self.rebuild()
+                self._loaded = True
+            self._remove(title)
+            self._add(title, content)
+            before, self._stamp = self._stamp, util.entries_version()
+            self._dirty = True
+            # Only the title goes to disk, other workers replay it from the log
+            if before != self._stamp:
+                self._append_log(before, title)
+
+    # On-disk format
+    def persist(self):
+        """
+        Write the index as gzipped JSON: titles and lengths are parallel
+        lists, each posting list is flattened to [id, tf, id, tf, ...]
+        """
+        path = self._path()
+        with self._lock:
+            if not path or not self._dirty:
+                return
+            data = {
+                "version": FORMAT_VERSION,
+                "stamp": self._stamp,
+                "titles": self._titles,
+                "lengths": self._lengths,
+                "postings": {
+                    term: [value for item in postings.items() for value in item]
+                    for term, postings in self._postings.items()
+                },
+            }
+            payload = gzip.compress(
+                json.dumps(data, separators=(",", ":")).encode("utf-8"), compresslevel=5)
+            self._dirty = False
+
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as output:
+                output.write(payload)
+            os.replace(temp, path)
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    # Save log: one JSON line per save, {"previous", "stamp", "title"}
+    def _append_log(self, previous, title):
+        """ Record a save, folding the log into a snapshot once it is large """
+        path = self._log_path()
+        if not path:
+            return
+        record = json.dumps({"previous": previous, "stamp": self._stamp, "title": title})
+        try:
+            with open(path, "a", encoding="utf-8") as log:
+                log.write(record + "\n")
+                size = log.tell()
+        except OSError:
+            return
+        if size > getattr(settings, "WIKI_SEARCH_LOG_BYTES", DEFAULT_LOG_BYTES):
+            self.persist()
+            # Safe under the writer lock, the snapshot now covers every line
+            with open(path, "w", encoding="utf-8"):
+                pass
+
+    def _read_log(self):
+        path = self._log_path()
+        if not path:
+            return []
+        records = []
+        try:
+            with open(path, encoding="utf-8") as log:
+                for line in log:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A line still being appended
+                        break
+        except OSError:
+            return []
+        return records
+
+    def _replay(self, stamp):
+        """
+        Catch up from the log to stamp, re-reading only the saved entries
+        Returns False if the log does not lead from our stamp to stamp
+        """
+        for record in self._read_log():
+            if self._stamp == stamp:
+                break
+            if record.get("previous") != self._stamp:
+                continue
+            title = record["title"]
+            content = util.get_entry(title)
+            self._remove(title)
+            if content is not None:
+                self._add(title, content)
+            self._stamp = record["stamp"]
+        return self._stamp == stamp
+
+    def _load(self, stamp=None):
+        """ Load the persisted index and replay the log up to stamp """
+        if stamp is None:
+            stamp = util.entries_version()
+        path = self._path()
+        if not path:
+            return False
+        try:
+            with open(path, "rb") as file:
+                data = json.loads(gzip.decompress(file.read()))
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != FORMAT_VERSION:
+            return False
+
+        self._clear()
+        self._stamp = data["stamp"]
+        self._titles = data["titles"]
+        self._lengths = data["lengths"]
+        self._ids = {title: doc for doc, title in enumerate(self._titles)}
+        terms = [[] for _ in self._titles]
+        for term, flat in data["postings"].items():
+            postings = dict(zip(flat[::2], flat[1::2]))
+            self._postings[term] = postings
+            for doc in postings:
+                terms[doc].append(term)
+        self._terms = [tuple(doc_terms) for doc_terms in terms]
+        self._vocab = sorted(self._postings)
+        self._total_length = sum(self._lengths)
+        self._count = sum(1 for doc_terms in self._terms if doc_terms)
+        return self._replay(stamp)
+
+    def _ensure_loaded(self):
+        stamp = util.entries_version()
+        if self._loaded and (self._stamp == stamp or self._replay(stamp)):
+            return
+        if not self._load(stamp):
+            self.rebuild()
+        self._loaded = True
+
+    def reset(self):
+        """ Drop everything, next access loads or rebuilds """
+        with self._lock:
+            self._clear()
+            self._loaded = False
+            self._dirty = False
+
+    # Querying
+    def _expand(self, token):
+        """ The exact term plus up to MAX_PREFIX_TERMS longer terms sharing its prefix """
+        matches = []
+        start = bisect.bisect_left(self._vocab, token)
+        for term in self._vocab[start:start + MAX_PREFIX_TERMS + 1]:
+            if not term.startswith(token):
+                break
+            matches.append((term, 1.0 if term == token else PREFIX_WEIGHT))
+        return matches
+
+    def search(self, query, limit=50):
+        """ Titles best matching query, highest BM25 score first """
+        tokens = tokenize(query)
+        with self._lock:
+            self._ensure_loaded()
+            if not tokens or not self._count:
+                return []
+
+            average = self._total_length / self._count
+            scores = {}
+            for token in tokens:
+                for term, weight in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (self._count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc, freq in postings.items():
+                        norm = K1 * (1 - B + B * self._lengths[doc] / average)
+                        score = weight * idf * freq * (K1 + 1) / (freq + norm)
+                        scores[doc] = scores.get(doc, 0.0) + score
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [self._titles[doc] for doc, _ in best]
+
+
+_index = SearchIndex()
+
+
+def search(query, limit=50):
+    """
+    Returns up to limit entry titles matching query, best first.
+    """
+    return _index.search(query, limit)
+
+
+def update(title, content, previous=None):
+    """
+    Re-indexes a single entry. Called by util.save_entry.
+    """
+    _index.update(title, content, previous)
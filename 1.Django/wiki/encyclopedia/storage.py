@@ -0,0 +1,239 @@
+""" Entry Storage Backends """
+
+import io
+import os
+import re
+import zlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Length
+from django.utils.module_loading import import_string
+
+try:
+    import fcntl
+except ImportError:  # Windows, fall back to in-process locking only
+    fcntl = None
+
+
+DEFAULT_BACKEND = "encyclopedia.storage.FileSystemBackend"
+
+_writer_threads = threading.Lock()
+
+
+class FileSystemBackend:
+    """
+    One Markdown file per entry under entries/ in default_storage
+    """
+
+    @staticmethod
+    def _path(title=None):
+        if title is None:
+            return default_storage.path("entries")
+        return default_storage.path(f"entries/{title}.md")
+
+    def version(self):
+        """ Changes whenever a file is added or renamed into place """
+        path = self._path()
+        try:
+            return f"{path}:{os.stat(path).st_mtime_ns}"
+        except FileNotFoundError:
+            return None
+
+    def list_titles(self):
+        """ All titles, unsorted """
+        if not os.path.isdir(self._path()):
+            return []
+        _, filenames = default_storage.listdir("entries")
+        return [re.sub(r"\.md$", "", filename)
+                for filename in filenames if filename.endswith(".md")]
+
+    def read(self, title):
+        """ Entry content, or None if there is no such entry """
+        try:
+            with default_storage.open(f"entries/{title}.md") as file:
+                return file.read().decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def modified(self, title=None):
+        """ File mtime, or the directory's when no title is given """
+        try:
+            return os.stat(self._path(title)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def size(self, title):
+        """ File size in bytes, None if there is no such entry """
+        try:
+            return os.stat(self._path(title)).st_size
+        except FileNotFoundError:
+            return None
+
+    def open(self, title):
+        """ Text stream over the entry, read lazily line by line """
+        try:
+            return open(self._path(title), encoding="utf-8")  # pylint: disable=consider-using-with
+        except FileNotFoundError:
+            return None
+
+    def validate(self, title):
+        """ Raises SuspiciousFileOperation if title would land outside entries/ """
+        path = os.path.normpath(self._path(title))
+        if os.path.dirname(path) != os.path.normpath(self._path()):
+            raise SuspiciousFileOperation(f"Entry title {title!r} is not a plain file name")
+
+    @contextmanager
+    def writer_lock(self):
+        """
+        Serialize all writers across threads and worker processes, so a
+        writer can tell the version change it caused from anyone else's
+        One fixed lock file however many titles are written
+        """
+        with _writer_threads:
+            if fcntl is None:
+                yield
+                return
+            lock_dir = os.path.join(self._path(), ".locks")
+            os.makedirs(lock_dir, exist_ok=True)
+            with open(os.path.join(lock_dir, "index.lock"), "a", encoding="utf-8") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def write(self, title, content):
+        """
+        Write once to a unique temp file, fsync it and rename it over
+        the entry, so readers never see a partial page
+        """
+        path = self._path(title)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temp = tempfile.mkstemp(dir=directory, prefix=".entry-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as output:
+                output.write(content.encode("utf-8"))
+                output.flush()
+                os.fsync(output.fileno())
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        _fsync_dir(directory)
+
+
+def _fsync_dir(directory):
+    """ Make a rename durable, not supported everywhere """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class DatabaseBackend:
+    """
+    Entries as rows of the Entry model, content zlib-compressed
+    Every operation is a lookup on an indexed column
+    """
+
+    @staticmethod
+    def _model():
+        from .models import Entry  # pylint: disable=import-outside-toplevel
+        return Entry
+
+    def version(self):
+        """ Max id moves on insert, max modified on update """
+        latest = self._model().objects.aggregate(id=Max("id"), modified=Max("modified"))
+        if latest["id"] is None:
+            return None
+        return f"db:{latest['id']}:{latest['modified'].isoformat()}"
+
+    def list_titles(self):
+        """ All titles, unsorted """
+        return list(self._model().objects.values_list("title", flat=True))
+
+    def read(self, title):
+        """ Entry content, or None if there is no such entry """
+        data = self._model().objects.filter(title=title).values_list("content", flat=True).first()
+        if data is None:
+            return None
+        return decompress(data)
+
+    def modified(self, title=None):
+        """ Row modified time, or the newest row's when no title is given """
+        entries = self._model().objects
+        if title is None:
+            modified = entries.aggregate(modified=Max("modified"))["modified"]
+        else:
+            modified = entries.filter(title=title).values_list("modified", flat=True).first()
+        return modified.timestamp() if modified is not None else None
+
+    def size(self, title):
+        """ Stored (compressed) size in bytes, None if there is no such entry """
+        return (self._model().objects.filter(title=title)
+                .annotate(size=Length("content")).values_list("size", flat=True).first())
+
+    def open(self, title):
+        """ Rows come back whole, so this only saves the caller a split """
+        content = self.read(title)
+        return io.StringIO(content) if content is not None else None
+
+    def validate(self, title):
+        """ Any title fits in a row """
+
+    @contextmanager
+    def writer_lock(self):
+        """
+        One writer per process at a time, and one transaction per save so
+        other workers' writes queue on the database's own write lock
+        """
+        with _writer_threads, transaction.atomic():
+            yield
+
+    def write(self, title, content):
+        """ Insert or replace the row for title """
+        self._model().objects.update_or_create(
+            title=title, defaults={"content": compress(content)})
+
+
+def compress(content):
+    """ Markdown text -> stored bytes """
+    return zlib.compress(content.encode("utf-8"), 6)
+
+
+def decompress(data):
+    """ Stored bytes -> Markdown text """
+    return zlib.decompress(bytes(data)).decode("utf-8")
+
+
+_backends = {}
+_backends_guard = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the backend named by settings.WIKI_STORAGE_BACKEND,
+    one shared instance per dotted path.
+    """
+    path = getattr(settings, "WIKI_STORAGE_BACKEND", DEFAULT_BACKEND)
+    with _backends_guard:
+        backend = _backends.get(path)
+        if backend is None:
+            backend = _backends[path] = import_string(path)()
+        return backend
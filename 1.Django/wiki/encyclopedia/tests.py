@@ -1,3 +1,439 @@
-from django.test import TestCase
+""" Django Tests """
 
-# Create your tests here.
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+
+from . import util, render, search
+from .models import Entry
+
+
+# Global Response Code
+SUCCESS_CODE = 200
+REDIRECT_CODE = 302
+NOT_MODIFIED_CODE = 304
+BAD_REQUEST_CODE = 400
+
+
+class WikiTestCase(TestCase):
+    """ Encyclopedia App Test """
+
+    def setUp(self):
+        """ Setting up a throwaway entries directory """
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, "entries"))
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            WIKI_RENDER_CACHE_DIR=os.path.join(self.media_root, "render_cache"),
+            WIKI_SEARCH_INDEX_PATH=os.path.join(self.media_root, "search_index.json.gz"))
+        self.override.enable()
+        util._index.reset()
+        render._cache.clear()
+        search._index.reset()
+
+        util.save_entry("Python", "# Python\n\nA language")
+        util.save_entry("Django", "# Django\n\nA framework")
+        util.save_entry("Dart", "# Dart\n\nAnother language")
+
+    def tearDown(self):
+        self.override.disable()
+        util._index.reset()
+        render._cache.clear()
+        search._index.reset()
+        shutil.rmtree(self.media_root)
+
+    # Entry Index Testing
+    def test_list_entries(self):
+        """ Entries are listed in sorted order """
+        self.assertEqual(util.list_entries(), ["Dart", "Django", "Python"])
+
+    def test_entry_exists(self):
+        """ Membership test on the index """
+        self.assertTrue(util.entry_exists("Django"))
+        self.assertFalse(util.entry_exists("Djang"))
+
+    def test_canonical_title(self):
+        """ Case-insensitive title lookup """
+        self.assertEqual(util.canonical_title("django"), "Django")
+        self.assertEqual(util.canonical_title("DART"), "Dart")
+        self.assertIsNone(util.canonical_title("Java"))
+        util.save_entry("JavaScript", "# JS")
+        self.assertEqual(util.canonical_title("javascript"), "JavaScript")
+
+    def test_entries_with_prefix(self):
+        """ Prefix lookup on the index """
+        self.assertEqual(util.entries_with_prefix("D"), ["Dart", "Django"])
+        self.assertEqual(util.entries_with_prefix("Z"), [])
+
+    def test_save_updates_index(self):
+        """ Saving a new entry shows up without a rescan """
+        util.list_entries()
+        generation = util._index.generation()
+        with mock.patch.object(util.get_backend(), "list_titles") as list_titles:
+            util.save_entry("Python", "# Python\n\nEdited")
+            self.assertEqual(util._index.generation(), generation)
+            util.save_entry("Git", "# Git")
+            list_titles.assert_not_called()
+        self.assertTrue(util.entry_exists("Git"))
+        self.assertEqual(len(util.list_entries()), 4)
+        self.assertEqual(util._index.generation(), generation + 1)
+
+    def save_racing_foreign_write(self, title, content):
+        """ save_entry while another worker writes Zebra in the middle of it """
+        backend = util.get_backend()
+        write = backend.write
+
+        def foreign_write():
+            with backend.writer_lock():
+                path = os.path.join(self.media_root, "entries", "Zebra.md")
+                with open(path, "w", encoding="utf-8") as file:
+                    file.write("# Zebra\n\nStripes")
+
+        other = threading.Thread(target=foreign_write)
+
+        def racing_write(*args):
+            other.start()
+            other.join(0.2)
+            write(*args)
+
+        with mock.patch.object(backend, "write", side_effect=racing_write):
+            util.save_entry(title, content)
+        other.join()
+
+    def test_save_locks_bounded(self):
+        """ Saving many titles leaves a single lock file behind """
+        for idx in range(20):
+            util.save_entry(f"Page {idx}", "# Page")
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "entries", ".locks")),
+                         ["index.lock"])
+
+    def test_save_racing_foreign_write(self):
+        """ A write by another worker during a save is not adopted unseen """
+        util.list_entries()
+        self.save_racing_foreign_write("Git", "# Git")
+        self.assertEqual(util.list_entries(), ["Dart", "Django", "Git", "Python", "Zebra"])
+
+    def test_search_racing_foreign_write(self):
+        """ A write by another worker during a save is still searchable """
+        search.search("python")
+        self.save_racing_foreign_write("Git", "# Git\n\nVersion control")
+        self.assertEqual(search.search("zebra"), ["Zebra"])
+        self.assertEqual(search.search("version"), ["Git"])
+
+    def test_external_change_detected(self):
+        """ Files added behind the index's back are picked up """
+        path = os.path.join(self.media_root, "entries", "HTML.md")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("# HTML")
+        # Make sure the directory mtime moves even on coarse filesystems
+        stat = os.stat(os.path.dirname(path))
+        os.utime(os.path.dirname(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertTrue(util.entry_exists("HTML"))
+
+    # Render Cache Testing
+    def test_render_cache_hit(self):
+        """ Second render of unchanged content skips markdown """
+        content = util.get_entry("Python")
+        html = render.render_entry("Python", content)
+        self.assertIn("<h1>Python</h1>", html)
+
+        with mock.patch.object(render, "markdown") as markdown:
+            self.assertEqual(render.render_entry("Python", content), html)
+            markdown.assert_not_called()
+
+    def test_render_cache_disk_tier(self):
+        """ A cold memory tier is refilled from disk """
+        content = util.get_entry("Python")
+        html = render.render_entry("Python", content)
+        render._cache.clear()
+        search._index.reset()
+
+        with mock.patch.object(render, "markdown") as markdown:
+            self.assertEqual(render.render_entry("Python", content), html)
+            markdown.assert_not_called()
+
+    def test_render_cache_disk_budget(self):
+        """ Old renders are pruned once the disk tier is over budget """
+        directory = os.path.join(self.media_root, "render_cache")
+        with override_settings(WIKI_RENDER_CACHE_DISK_BYTES=1000):
+            for idx in range(20):
+                render.render_entry("Python", f"# Python\n\nEdit {idx} {'x' * 100}")
+        files = [os.path.join(root, name) for root, _, names in os.walk(directory)
+                 for name in names]
+        self.assertLessEqual(sum(os.path.getsize(path) for path in files), 1000)
+        newest = render.content_hash(f"# Python\n\nEdit 19 {'x' * 100}")
+        self.assertIn(f"{newest}.html", [os.path.basename(path) for path in files])
+
+    def test_render_cache_disk_walked_once(self):
+        """ Misses under budget keep a running total instead of walking the tier """
+        with mock.patch.object(render._cache, "_disk_files",
+                               wraps=render._cache._disk_files) as disk_files:
+            for idx in range(20):
+                render.render_entry("Python", f"# Python\n\nEdit {idx}")
+        self.assertEqual(disk_files.call_count, 1)
+
+    def test_render_cache_invalidated_by_save(self):
+        """ Saving an entry renders the new content """
+        render.render_entry("Python", util.get_entry("Python"))
+        util.save_entry("Python", "# Snake")
+        html = render.render_entry("Python", util.get_entry("Python"))
+        self.assertIn("<h1>Snake</h1>", html)
+
+    def test_render_cache_budget(self):
+        """ Memory tier never exceeds its byte budget """
+        with override_settings(WIKI_RENDER_CACHE_BYTES=64, WIKI_RENDER_CACHE_DIR=None):
+            render.render_entry("A", "a" * 40)
+            render.render_entry("B", "b" * 40)
+            self.assertLessEqual(render._cache._size, 64)
+            self.assertNotIn("A", render._cache._slots)
+
+    # Search Index Testing
+    def test_search_ranks_body_matches(self):
+        """ Body words are searchable, title matches rank first """
+        self.assertEqual(set(search.search("language")), {"Dart", "Python"})
+        self.assertEqual(search.search("python language")[0], "Python")
+
+    def test_search_prefix(self):
+        """ Partial words match by prefix """
+        self.assertEqual(search.search("frame"), ["Django"])
+        self.assertEqual(search.search("nothing"), [])
+
+    def test_search_incremental_update(self):
+        """ Saving an entry re-indexes it """
+        util.save_entry("Dart", "# Dart\n\nA game with arrows")
+        self.assertEqual(set(search.search("language")), {"Python"})
+        self.assertEqual(search.search("arrows"), ["Dart"])
+
+    def test_search_persisted(self):
+        """ A fresh process loads the index from disk """
+        search.search("language")
+        search._index.persist()
+        search._index.reset()
+        with mock.patch.object(search._index, "rebuild") as rebuild:
+            self.assertEqual(search.search("framework"), ["Django"])
+            rebuild.assert_not_called()
+
+    def test_search_shared_between_workers(self):
+        """ A save in one worker is picked up by another without a rebuild """
+        other = search.SearchIndex()
+        self.assertEqual(other.search("framework"), ["Django"])
+        util.save_entry("Flask", "# Flask\n\nA micro framework")
+        with mock.patch.object(other, "rebuild") as rebuild:
+            self.assertEqual(set(other.search("micro")), {"Flask"})
+            rebuild.assert_not_called()
+
+    def test_search_save_appends_log(self):
+        """ A save logs its title instead of rewriting the whole index """
+        search.search("language")
+        with mock.patch.object(search._index, "persist") as persist:
+            util.save_entry("Flask", "# Flask\n\nA micro framework")
+            persist.assert_not_called()
+        with open(search._index._log_path(), encoding="utf-8") as log:
+            self.assertIn('"title": "Flask"', log.read())
+
+    def test_search_log_compacted(self):
+        """ A long log is folded into a fresh snapshot and emptied """
+        search.search("language")
+        with self.settings(WIKI_SEARCH_LOG_BYTES=1):
+            util.save_entry("Flask", "# Flask\n\nA micro framework")
+        self.assertEqual(os.path.getsize(search._index._log_path()), 0)
+        search._index.reset()
+        with mock.patch.object(search._index, "rebuild") as rebuild:
+            self.assertEqual(search.search("micro"), ["Flask"])
+            rebuild.assert_not_called()
+
+    # Save Entry Testing
+    def test_remove_newline(self):
+        """ Blank lines and carriage returns are dropped in memory """
+        self.assertEqual(util.remove_newline("# A\r\n\r\nText\r\n"), "# A\nText\n")
+
+    def test_save_is_atomic(self):
+        """ Concurrent saves leave one complete entry and no temp files """
+        bodies = [f"# Race\n\n{'x' * 10000}{idx}" for idx in range(8)]
+        threads = [threading.Thread(target=util.save_entry, args=("Race", body))
+                   for body in bodies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIn(util.get_entry("Race"), bodies)
+        leftovers = [name for name in os.listdir(os.path.join(self.media_root, "entries"))
+                     if name.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+
+    def test_save_outside_entries(self):
+        """ Titles escaping entries/ are refused before any file is touched """
+        victim = os.path.join(self.media_root, "victim.lock")
+        with open(victim, "w", encoding="utf-8") as file:
+            file.write("keep")
+
+        client = Client()
+        for title in ("../victim", "../../victim", "sub/victim"):
+            response = client.post("/edit", {"title": title, "content": "# Gone"})
+            self.assertEqual(response.status_code, BAD_REQUEST_CODE, title)
+        with open(victim, encoding="utf-8") as file:
+            self.assertEqual(file.read(), "keep")
+        created = [name for _, _, names in os.walk(self.media_root)
+                   for name in names if "victim" in name]
+        self.assertEqual(created, ["victim.lock"])
+
+    # Storage Backend Testing
+    @override_settings(WIKI_STORAGE_BACKEND="encyclopedia.storage.DatabaseBackend")
+    def test_database_backend(self):
+        """ Entries round-trip through the Entry table """
+        self.assertEqual(util.list_entries(), [])
+        util.save_entry("Python", "# Python\r\nin a table")
+        util.save_entry("Python", "# Python\r\nstill in a table")
+        util.save_entry("Git", "# Git")
+
+        self.assertEqual(Entry.objects.count(), 2)
+        self.assertEqual(util.list_entries(), ["Git", "Python"])
+        self.assertEqual(util.get_entry("Python"), "# Python\nstill in a table")
+        self.assertIsNone(util.get_entry("Java"))
+        self.assertIn(util.random_entry(), ["Git", "Python"])
+
+    def test_import_export_entries(self):
+        """ Bulk copy the .md directory into the database and back """
+        entries = os.path.join(self.media_root, "entries")
+        call_command("import_entries", entries, stdout=StringIO())
+        call_command("import_entries", entries, stdout=StringIO())
+        self.assertEqual(Entry.objects.count(), 3)
+
+        exported = os.path.join(self.media_root, "exported")
+        call_command("export_entries", exported, stdout=StringIO())
+        self.assertEqual(sorted(os.listdir(exported)), ["Dart.md", "Django.md", "Python.md"])
+        with open(os.path.join(exported, "Python.md"), encoding="utf-8") as file:
+            self.assertEqual(file.read(), util.get_entry("Python"))
+
+    # Client Testing
+    def test_page(self):
+        """ Test Wiki Page """
+        client = Client()
+        response = client.get("/wiki/Python")
+        self.assertEqual(response.status_code, SUCCESS_CODE)
+        self.assertIn("<h1>Python</h1>", response.context["content"])
+
+    def test_search_view(self):
+        """ Test Search Page """
+        client = Client()
+
+        # Exact title redirects
+        response = client.post("/search", {"q": "Python"})
+        self.assertEqual(response.status_code, REDIRECT_CODE)
+
+        # Anything else lists ranked candidates
+        response = client.post("/search", {"q": "lang"})
+        self.assertEqual(response.status_code, SUCCESS_CODE)
+        self.assertEqual(set(response.context["candidates"]), {"Dart", "Python"})
+
+    def test_edit_view(self):
+        """ Test Edit Submission """
+        client = Client()
+        response = client.post("/edit", {"title": "Python", "content": "# Python\r\n\r\nEdited"})
+        self.assertEqual(response.status_code, REDIRECT_CODE)
+        self.assertEqual(util.get_entry("Python"), "# Python\nEdited")
+
+    def test_rand_view(self):
+        """ Test Random Page without rescanning entries """
+        client = Client()
+        util.list_entries()
+
+        with mock.patch.object(util.get_backend(), "list_titles") as list_titles:
+            response = client.get("/rand")
+            list_titles.assert_not_called()
+        self.assertEqual(response.status_code, REDIRECT_CODE)
+        self.assertIn(response.url, ["/wiki/Dart", "/wiki/Django", "/wiki/Python"])
+
+    def test_page_conditional_get(self):
+        """ Test 304 for a page the client already holds """
+        client = Client()
+        response = client.get("/wiki/Python")
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        with mock.patch("encyclopedia.views.render_entry") as render_entry:
+            response = client.get("/wiki/Python", HTTP_IF_NONE_MATCH=etag)
+            render_entry.assert_not_called()
+        self.assertEqual(response.status_code, NOT_MODIFIED_CODE)
+
+        response = client.get("/wiki/Python", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, NOT_MODIFIED_CODE)
+
+        # Edits change the ETag
+        util.save_entry("Python", "# Python\n\nEdited")
+        response = client.get("/wiki/Python", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, SUCCESS_CODE)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_page_case_insensitive(self):
+        """ Test Page Lookup Ignores Case """
+        client = Client()
+        response = client.get("/wiki/pYTHON")
+        self.assertEqual(response.status_code, SUCCESS_CODE)
+        self.assertEqual(response.context["title"], "Python")
+
+        # Misses never list the backend
+        with mock.patch.object(util.get_backend(), "list_titles") as list_titles:
+            response = client.get("/wiki/Java")
+            list_titles.assert_not_called()
+        self.assertEqual(response.context["title"], "404")
+
+    def test_blocks_keep_html_and_lists(self):
+        """ Raw HTML blocks and loose lists are never split apart """
+        content = "<div>\n\nhi\n\n</div>\n\n1. one\n\n2. two\n\nafter\n"
+        blocks = list(render.iter_blocks(content.splitlines(keepends=True)))
+        self.assertEqual(blocks, ["<div>\n\nhi\n\n</div>\n\n", "1. one\n\n2. two\n\n", "after\n"])
+        html = "".join(render.iter_rendered(content.splitlines(keepends=True)))
+        self.assertEqual(html.count("<ol>"), 1)
+        self.assertNotIn("<p><div>", html)
+
+    @override_settings(WIKI_STREAM_THRESHOLD=16)
+    def test_page_streamed(self):
+        """ Test Large Pages Are Streamed Block By Block """
+        util.save_entry("Big", "# Big\n\nFirst paragraph\n\n```\ncode\n\nstill code\n```\n")
+        client = Client()
+        response = client.get("/wiki/Big")
+        self.assertEqual(response.status_code, SUCCESS_CODE)
+        self.assertTrue(response.streaming)
+
+        chunks = [chunk.decode("utf-8") for chunk in response.streaming_content]
+        self.assertIn("Random Page", chunks[0])
+        body = "".join(chunks)
+        self.assertIn("<h1>Big</h1>", body)
+        self.assertIn("<p>First paragraph</p>", body)
+        self.assertIn("still code", body)
+        self.assertTrue(body.rstrip().endswith("</html>"))
+
+        response = client.get("/wiki/Big", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, NOT_MODIFIED_CODE)
+
+    def test_sidebar_fragment(self):
+        """ Test Sidebar Is Rendered Once Per Generation """
+        client = Client()
+        response = client.get("/")
+        self.assertIn('href="/wiki/Django"', response.content.decode("utf-8"))
+
+        with mock.patch.object(util, "render_to_string") as render_to_string:
+            client.get("/")
+            client.get("/wiki/Python")
+            render_to_string.assert_not_called()
+
+        # Editing an existing entry leaves the list of titles, and the sidebar, alone
+        digest = util._index.digest()
+        with mock.patch.object(util, "render_to_string") as render_to_string:
+            util.save_entry("Python", "# Python\n\nEdited")
+            client.get("/")
+            render_to_string.assert_not_called()
+        self.assertIs(util._index._digest, digest)
+
+        # A new title moves the generation and shows up
+        util.save_entry("Git", "# Git")
+        response = client.get("/")
+        self.assertIn('href="/wiki/Git"', response.content.decode("utf-8"))
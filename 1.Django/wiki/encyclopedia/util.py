@@ -1,19 +1,236 @@
 """ Utility Functions """
 
-import re
-import os
+import bisect
+import random
+import hashlib
+import threading
 
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import render, search
+from .storage import get_backend
+
+
+class EntryIndex:
+    """
+    Process-wide sorted index of entry titles
+    Built once from the storage backend, kept up to date by
+    save_entry and rebuilt only when the backend version changes
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._titles = []
+        self._stamp = None
+        self._digest = None
+        self._folded = {}
+        self._generation = 0
+
+    @staticmethod
+    def _current_stamp():
+        """ Cheap change detector: one stat() or indexed query instead of a listing """
+        backend = get_backend()
+        return (backend, backend.version())
+
+    def _refresh(self):
+        """ Rebuild the index if the entries changed under us """
+        stamp = self._current_stamp()
+        if stamp == self._stamp:
+            return
+
+        backend, version = stamp
+        self._titles = sorted(backend.list_titles()) if version is not None else []
+        self._stamp = stamp
+        self._digest = None
+        self._generation += 1
+        self._folded = {}
+        for title in self._titles:
+            self._folded.setdefault(title.casefold(), title)
+
+    def titles(self):
+        """ Sorted list of all titles (a copy, safe to mutate) """
+        with self._lock:
+            self._refresh()
+            return list(self._titles)
+
+    def contains(self, title):
+        """ O(log n) membership test """
+        with self._lock:
+            self._refresh()
+            idx = bisect.bisect_left(self._titles, title)
+            return idx < len(self._titles) and self._titles[idx] == title
+
+    def canonical(self, title):
+        """ Stored title matching title case-insensitively, one dict probe """
+        with self._lock:
+            self._refresh()
+            return self._folded.get(title.casefold())
+
+    def with_prefix(self, prefix):
+        """ All titles starting with prefix, in sorted order """
+        with self._lock:
+            self._refresh()
+            start = bisect.bisect_left(self._titles, prefix)
+            end = start
+            while end < len(self._titles) and self._titles[end].startswith(prefix):
+                end += 1
+            return self._titles[start:end]
+
+    def generation(self):
+        """ Bumped every time the list of titles changes """
+        with self._lock:
+            self._refresh()
+            return self._generation
+
+    def snapshot(self):
+        """ Generation counter and titles, read together """
+        with self._lock:
+            self._refresh()
+            return self._generation, list(self._titles)
+
+    def digest(self):
+        """ Hash of the title list, the same in every worker """
+        with self._lock:
+            self._refresh()
+            if self._digest is None:
+                self._digest = hashlib.sha256(
+                    "\n".join(self._titles).encode("utf-8")).hexdigest()
+            return self._digest
+
+    def random(self):
+        """ O(1) uniform pick straight from the title array, None if empty """
+        with self._lock:
+            self._refresh()
+            return random.choice(self._titles) if self._titles else None
+
+    def add(self, title, previous=None):
+        """
+        Record a newly written entry without rescanning the directory
+        previous is the backend version from just before the write; the
+        caller holds the backend's writer lock, so if the index was current
+        then, only our own write has happened since
+        """
+        with self._lock:
+            if self._stamp != (get_backend(), previous):
+                self._refresh()
+            idx = bisect.bisect_left(self._titles, title)
+            if idx == len(self._titles) or self._titles[idx] != title:
+                self._titles.insert(idx, title)
+                self._digest = None
+                self._generation += 1
+                self._folded.setdefault(title.casefold(), title)
+            # Our own write bumped the backend version, adopt it
+            self._stamp = self._current_stamp()
+
+    def reset(self):
+        """ Drop everything, next access rebuilds from disk """
+        with self._lock:
+            self._titles = []
+            self._stamp = None
+            self._digest = None
+            self._folded = {}
+
+
+_index = EntryIndex()
+
+
+def entries_version():
+    """
+    Returns an opaque token that changes whenever the set of
+    entries in storage may have changed.
+    """
+    return get_backend().version()
 
 
 def list_entries():
     """
     Returns a list of all names of encyclopedia entries.
     """
-    _, filenames = default_storage.listdir("entries")
-    return list(sorted(re.sub(r"\.md$", "", filename)
-                for filename in filenames if filename.endswith(".md")))
+    return _index.titles()
+
+
+def entry_exists(title):
+    """
+    Returns True if an entry with exactly this title exists.
+    """
+    return _index.contains(title)
+
+
+def canonical_title(title):
+    """
+    Returns the stored title matching title regardless of case,
+    or None if there is no such entry.
+    """
+    return _index.canonical(title)
+
+
+def entries_with_prefix(prefix):
+    """
+    Returns the sorted names of all entries starting with prefix.
+    """
+    return _index.with_prefix(prefix)
+
+
+_sidebar = (None, "")
+_sidebar_lock = threading.Lock()
+
+
+def sidebar_html():
+    """
+    Returns the rendered sidebar list of entries. The fragment is
+    rendered once per index generation, which moves whenever the
+    list of titles changes.
+    """
+    global _sidebar  # pylint: disable=global-statement
+    generation = _index.generation()
+    with _sidebar_lock:
+        if _sidebar[0] == generation:
+            return _sidebar[1]
+
+    generation, titles = _index.snapshot()
+    html = mark_safe(render_to_string("encyclopedia/sidebar.html", {"entries": titles}))
+    with _sidebar_lock:
+        _sidebar = (generation, html)
+    return html
+
+
+def entry_modified(title=None):
+    """
+    Returns the POSIX timestamp of the last change to an entry,
+    or to any entry when no title is given; None if unknown.
+    """
+    return get_backend().modified(title)
+
+
+def entry_size(title):
+    """
+    Returns the stored size of an entry in bytes, or None if
+    no such entry exists.
+    """
+    return get_backend().size(title)
+
+
+def open_entry(title):
+    """
+    Returns a text stream over an entry for incremental reading,
+    or None if no such entry exists. The caller closes it.
+    """
+    return get_backend().open(title)
+
+
+def entry_etag(title, content):
+    """
+    Returns a strong ETag for an entry page. It covers the entry
+    content, the page templates and the sidebar's list of titles.
+    Pages too large to read up front pass a size/mtime fingerprint
+    in place of the content.
+    """
+    template_version = getattr(settings, "WIKI_TEMPLATE_VERSION", 1)
+    tag = hashlib.sha256(f"{title}\n{template_version}\n{_index.digest()}\n".encode("utf-8"))
+    tag.update(content.encode("utf-8"))
+    return f'"{tag.hexdigest()[:32]}"'
 
 
 def save_entry(title, content):
@@ -21,11 +238,20 @@ def save_entry(title, content):
     Saves an encyclopedia entry, given its title and Markdown
     content. If an existing entry with the same title already exists,
     it is replaced.
+    Writers are serialized across threads and workers, and the
+    backend writes the entry once, atomically.
     """
-    filename = f"entries/{title}.md"
-    if default_storage.exists(filename):
-        default_storage.delete(filename)
-    default_storage.save(filename, ContentFile(content))
+    content = content.replace("\r\n", "\n").replace("\r", "\n")
+    backend = get_backend()
+    backend.validate(title)
+
+    with backend.writer_lock():
+        previous = entries_version()
+        backend.write(title, content)
+
+        _index.add(title, previous)
+        render.invalidate(title)
+        search.update(title, content, previous)
 
 
 def get_entry(title):
@@ -33,28 +259,24 @@ def get_entry(title):
     Retrieves an encyclopedia entry by its title. If no such
     entry exists, the function returns None.
     """
-    try:
-        file = default_storage.open(f"entries/{title}.md")
-        return file.read().decode("utf-8")
-    except FileNotFoundError:
-        return None
+    return get_backend().read(title)
+
+
+def random_entry():
+    """
+    Returns the title of a uniformly chosen entry, or None if
+    there are no entries.
+    """
+    return _index.random()
 
-def remove_newline(title):
+
+def remove_newline(content):
     """
     Found a problem when editing the Wiki pages
     Newlines get piled up whenver edits are saved
-    This function removes extra newlines in a md file
+    This function removes extra newlines from Markdown content
     """
-    # Read from current file and write to another temp file
-    filename = os.path.join("entries", f"{title}.md")
-    temp = os.path.join("entries", "temp.txt")
-
-    with open(filename, encoding="utf-8") as file:
-        with open(temp, 'w', encoding='utf-8') as output:
-            for line in file:
-                # If line does not start with newline, write to new file
-                if not line.startswith('\n'):
-                    output.write(line)
+    lines = content.replace("\r\n", "\n").replace("\r", "\n").splitlines(keepends=True)
 
-    # Replace original file with the new file content
-    os.replace(temp, filename)
+    # Keep every line that is not just a newline
+    return "".join(line for line in lines if not line.startswith("\n"))
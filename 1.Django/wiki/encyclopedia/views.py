@@ -1,72 +1,124 @@
 """ View Functions """
 
-import random
-
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, redirect
-from markdown2 import markdown
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
 from . import util, forms
+from . import search as search_index
+from .render import render_entry, iter_rendered
+
+
+STREAM_MARKER = "<!--encyclopedia:content-->"
 
 
 def index(request):
     """ Home Page """
-    return render(request, "encyclopedia/index.html", {
-        "entries": util.list_entries()
+    return render(request, "encyclopedia/index.html")
+
+def _not_found(request):
+    """ Page Not Found """
+    return render(request, "encyclopedia/error.html", {
+        "title": "404",
+        "content": "Page Not Found",
+        "name": ''
     })
 
+def _validators(request, title, fingerprint):
+    """ ETag, Last-Modified and a 304 response if the client is current """
+    etag = util.entry_etag(title, fingerprint)
+    last_modified = max(filter(None, (util.entry_modified(title), util.entry_modified())),
+                        default=None)
+    last_modified = int(last_modified) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return etag, last_modified, response
+
+def _set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+def _stream_page(request, title, size):
+    """ Send layout and sidebar first, then the entry block by block """
+    fingerprint = f"{size}:{util.entry_modified(title)}"
+    etag, last_modified, response = _validators(request, title, fingerprint)
+    if response is not None:
+        return _set_validators(response, etag, last_modified)
+
+    stream = util.open_entry(title)
+    if stream is None:
+        return _not_found(request)
+
+    head, tail = render_to_string("encyclopedia/page.html", {
+        "title": title,
+        "content": STREAM_MARKER
+    }, request=request).split(STREAM_MARKER, 1)
+
+    def chunks():
+        with stream:
+            yield head
+            yield from iter_rendered(stream)
+        yield tail
+
+    return _set_validators(StreamingHttpResponse(chunks()), etag, last_modified)
+
 def page(request, title):
     """ Any Wiki Page """
-    title = (title.upper() if title.lower() in ("html", "css") else title.capitalize())
-    content = util.get_entry(title)
+    canonical = util.canonical_title(title)
+    title = canonical or title
 
     if request.method == "GET":
-        # Page Not Found
+        if canonical is None:
+            return _not_found(request)
+
+        # Large entries are streamed instead of read whole
+        size = util.entry_size(title)
+        if size is not None and size > getattr(settings, "WIKI_STREAM_THRESHOLD", 1024 * 1024):
+            return _stream_page(request, title, size)
+
+        content = util.get_entry(title)
         if content is None:
-            return render(request, "encyclopedia/error.html", {
-                "title": "404",
-                "content": "Page Not Found",
-                "name": '',
-                "entries": util.list_entries()
-            })
+            return _not_found(request)
+
+        # Answer 304 if the client already has this version
+        etag, last_modified, response = _validators(request, title, content)
 
         # Render the corresponding page
-        return render(request, "encyclopedia/page.html", {
-            "title": title,
-            "content": markdown(content),
-            "entries": util.list_entries()
-        })
+        if response is None:
+            response = render(request, "encyclopedia/page.html", {
+                "title": title,
+                "content": render_entry(title, content)
+            })
+        return _set_validators(response, etag, last_modified)
 
     # If is POST, take to edit page
+    content = util.get_entry(canonical) if canonical is not None else None
     form = forms.EditPageForm(initial={"title": title, "content":content})
     return render(request, "encyclopedia/edit.html", {
         "title": title,
-        "form": form,
-        "entries": util.list_entries()
+        "form": form
     })
 
 def search(request):
     """ Search for a Wiki Page """
     if request.method == "POST":
-        query = request.POST.get('q').lower()
-        entries = [entry.lower() for entry in util.list_entries()]
-
-        # If query is in entries, redirect to that page
-        if query in entries:
-            return redirect('page', title=query)
-
-        # Check if query is substring of any entries
-        # Reformat the entries
-        candidates = [entry for entry in entries if query in entry]
-        for idx, entry in enumerate(candidates):
-            if entry in ("html", "css"):
-                candidates[idx] = entry.upper()
-            else:
-                candidates[idx] = entry.capitalize()
+        query = request.POST.get('q', '').strip()
+
+        # If query names an entry, redirect to that page
+        title = util.canonical_title(query)
+        if title is not None:
+            return redirect('page', title=title)
+
+        # Otherwise rank entries by how well they match
+        candidates = search_index.search(query)
 
         # Show all candidates
         return render(request, "encyclopedia/search.html", {
-            "candidates": candidates,
-            "entries": util.list_entries()
+            "candidates": candidates
         })
 
     return index(request)
@@ -77,8 +129,7 @@ def new(request):
     if request.method == "GET":
         form = forms.NewPageForm()
         return render(request, "encyclopedia/new.html", {
-            "form": form,
-            "entries": util.list_entries()
+            "form": form
         })
 
     # Otherwise is during form submission (POST)
@@ -89,14 +140,13 @@ def new(request):
         title = form.cleaned_data["title"]
         content = form.cleaned_data["content"]
 
-        # Check for existance
+        # Check for existance, ignoring case
         # Render error page if exists
-        if title in util.list_entries():
+        if util.canonical_title(title) is not None:
             return render(request, "encyclopedia/error.html", {
                 "title": "Page Exist",
                 "content": "There is already a Wiki page named ",
-                "name": title,
-                "entries": util.list_entries()
+                "name": title
                 })
 
         # Save New if new
@@ -114,15 +164,15 @@ def edit(request):
         title = form.cleaned_data["title"]
         content = form.cleaned_data["content"]
 
-        util.save_entry(title, content)
-        util.remove_newline(title)
+        util.save_entry(title, util.remove_newline(content))
         return redirect('page', title=title)
 
     return redirect('page', title=title)
 
 def rand(request):
     """ Randomly Redirect to a Wiki Page """
-    if request.method == "GET":
-        return redirect('page', title=random.choice(util.list_entries()))
+    title = util.random_entry()
+    if title is None:
+        return redirect('index')
 
-    return redirect('page', title=random.choice(util.list_entries()))
+    return redirect('page', title=title)
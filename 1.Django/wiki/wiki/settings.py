@@ -63,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'encyclopedia.context_processors.sidebar',
             ],
         },
     },
@@ -119,3 +120,37 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+DEFAULT_AUTO_FIELD='django.db.models.AutoField'
+
+
+# Where entries live: FileSystemBackend (entries/*.md) or DatabaseBackend (Entry table)
+# Move between them with manage.py import_entries / export_entries
+
+WIKI_STORAGE_BACKEND = 'encyclopedia.storage.FileSystemBackend'
+
+
+# Bump whenever the encyclopedia templates change, it is part of every page ETag
+
+WIKI_TEMPLATE_VERSION = 1
+
+# Rendered wiki pages
+# Memory and disk tier budgets in bytes, and directory for the on-disk tier (None disables it)
+
+WIKI_RENDER_CACHE_BYTES = 16 * 1024 * 1024
+
+WIKI_RENDER_CACHE_DIR = os.path.join(BASE_DIR, 'render_cache')
+
+WIKI_RENDER_CACHE_DISK_BYTES = 256 * 1024 * 1024
+
+# Entries larger than this many bytes are streamed block by block instead of cached
+
+WIKI_STREAM_THRESHOLD = 1024 * 1024
+
+
+# Full-text search index: a snapshot plus a log of later saves,
+# folded into a new snapshot once the log grows past WIKI_SEARCH_LOG_BYTES
+
+WIKI_SEARCH_INDEX_PATH = os.path.join(BASE_DIR, 'search_index.json.gz')
+
+WIKI_SEARCH_LOG_BYTES = 256 * 1024
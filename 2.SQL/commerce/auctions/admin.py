@@ -2,12 +2,13 @@
 
 from django.contrib import admin
 
-from .models import User, Category, AuctionListing, Bid, Comment, WatchList
+from .models import User, Category, AuctionListing, Bid, BidHistory, Comment, WatchList
 
 # Register your models here.
 admin.site.register(User)
 admin.site.register(Category)
 admin.site.register(AuctionListing)
 admin.site.register(Bid)
+admin.site.register(BidHistory)
 admin.site.register(Comment)
 admin.site.register(WatchList)
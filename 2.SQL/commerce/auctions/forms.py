@@ -17,3 +17,11 @@ class NewListingForm(forms.Form):
     url = forms.CharField(label='', required=False,
         widget=forms.URLInput(attrs={"placeholder":"Image URL",
         "class": "form-control"}))
+    duration = forms.IntegerField(label='', required=False, min_value=1, max_value=30,
+        widget=forms.NumberInput(attrs={"placeholder":"Days Open (optional)",
+        "class": "form-control"}))
+
+
+class BidForm(forms.Form):
+    """ Bid on a Listing, amounts must fit the price columns """
+    bidamount = forms.DecimalField(max_digits=10, decimal_places=2, min_value=0)
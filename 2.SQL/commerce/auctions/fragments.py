@@ -0,0 +1,88 @@
+""" Cached Listing Page Fragments """
+# pylint: disable=no-member
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+
+from .models import AuctionListing, Comment
+
+
+DEFAULT_TIMEOUT = 300
+COMMENT_PAGE_SIZE = 20
+
+
+def _version_key(listing_id):
+    return f"listing:{listing_id}:version"
+
+
+def _fragment_key(listing_id, version):
+    return f"listing:{listing_id}:fragment:{version}"
+
+
+def version(listing_id):
+    """ Current version counter of a listing's cached fragment
+    A missing counter is seeded from the clock, so a counter that was
+    evicted never comes back at a value an old fragment was stored under
+    """
+    key = _version_key(listing_id)
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        current = cache.get(key)
+    return current
+
+
+def invalidate(listing_id):
+    """ Move the listing on to a new version, old fragments just expire """
+    try:
+        cache.incr(_version_key(listing_id))
+    except ValueError:
+        cache.set(_version_key(listing_id), time.time_ns(), timeout=None)
+
+
+def invalidate_many(listing_ids):
+    """ invalidate() for a batch of listings """
+    now = time.time_ns()
+    cache.set_many({_version_key(listing_id): now for listing_id in listing_ids}, timeout=None)
+
+
+def build(listing_id):
+    """ Everything on the listing page that is the same for every user
+    Only the first page of comments, the page fetches the rest on scroll
+    Raises Http404 if there is no such listing
+    """
+    item = get_object_or_404(
+        AuctionListing.objects.select_related("user", "category")
+        .only("name", "description", "current_price", "bid_count", "imgurl", "active",
+              "winner", "user__nickname", "category__category"),
+        id=listing_id)
+    comments, after = (Comment.objects.filter(auc_list=item.id).select_related("user")
+                       .keyset("created", size=COMMENT_PAGE_SIZE))
+    return {
+        "id": item.id,
+        "owner_id": item.user_id,
+        "winner_id": item.winner_id,
+        "active": item.active,
+        "price": item.current_price,
+        "minbid": item.min_bid(),
+        "header": render_to_string("auctions/listing_header.html", {"item": item}),
+        "comments": render_to_string("auctions/listing_comments.html", {"comments": comments}),
+        "comments_after": after,
+    }
+
+
+def listing_fragment(listing_id):
+    """ Shared part of a listing page, rendered only on a cache miss
+    The version is read before the database, so a fragment built while a
+    bid commits is stored under the version that bid has already retired
+    """
+    key = _fragment_key(listing_id, version(listing_id))
+    fragment = cache.get(key)
+    if fragment is None:
+        fragment = build(listing_id)
+        cache.set(key, fragment, getattr(settings, "LISTING_CACHE_TIMEOUT", DEFAULT_TIMEOUT))
+    return fragment
@@ -0,0 +1,25 @@
+""" Close listings whose end time has passed """
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.models import AuctionListing
+
+
+class Command(BaseCommand):
+    """ python manage.py close_expired_listings [--loop SECONDS] """
+    help = "Close expired listings in batches and record their winners"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--loop", type=float, metavar="SECONDS",
+                            help="Keep running, sweeping every SECONDS")
+
+    def handle(self, *args, **options):
+        while True:
+            closed = AuctionListing.objects.close_expired(batch_size=options["batch_size"])
+            self.stdout.write(f"Closed {closed} expired listings")
+            if not options["loop"]:
+                return
+            time.sleep(options["loop"])
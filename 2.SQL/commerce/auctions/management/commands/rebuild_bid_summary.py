@@ -0,0 +1,48 @@
+""" Recompute every listing's bid summary from the bid ledger """
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from auctions import fragments
+from auctions.models import AuctionListing, BidHistory
+
+
+# Listing fragments are invalidated this many at a time
+INVALIDATE_BATCH = 500
+
+
+class Command(BaseCommand):
+    """ python manage.py rebuild_bid_summary """
+    help = "Rebuild current_price, bid_count, top_bidder and last_bid_at from BidHistory"
+
+    def handle(self, *args, **options):
+        ledger = BidHistory.objects.filter(auc_list=OuterRef("pk")).order_by()
+        per_listing = ledger.values("auc_list")
+
+        # One UPDATE over all listings, each column a correlated subquery on the ledger index
+        with transaction.atomic():
+            updated = AuctionListing.objects.update(
+                bid_count=Coalesce(Subquery(per_listing.annotate(n=Count("id")).values("n")), 0),
+                current_price=Coalesce(
+                    Subquery(per_listing.annotate(top=Max("amount")).values("top")),
+                    F("price")),
+                last_bid_at=Subquery(per_listing.annotate(last=Max("created")).values("last")),
+                top_bidder=Subquery(ledger.order_by("-amount", "created", "id")
+                                    .values("user")[:1]),
+            )
+
+        # After the commit, so no fragment is rebuilt from the old summary
+        # under the new version
+        ids = AuctionListing.objects.order_by("id").values_list("id", flat=True)
+        batch = []
+        for listing_id in ids.iterator(chunk_size=INVALIDATE_BATCH):
+            batch.append(listing_id)
+            if len(batch) == INVALIDATE_BATCH:
+                fragments.invalidate_many(batch)
+                batch = []
+        if batch:
+            fragments.invalidate_many(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt bid summary for {updated} listings"))
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.6 on 2026-10-18 18:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_current_bid(apps, schema_editor):
+    """ Seed the denormalized columns from the existing bids """
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+    Bid = apps.get_model("auctions", "Bid")
+
+    for item in AuctionListing.objects.all():
+        bids = Bid.objects.filter(auc_list=item)
+        top = bids.order_by("-amount").first()
+        item.bid_count = bids.count()
+        item.current_price = top.amount if top is not None else item.price
+        item.top_bidder_id = top.user_id if top is not None else None
+        item.save(update_fields=["current_price", "bid_count", "top_bidder"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auctions', '0003_alter_auctionlisting_imgurl'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='current_price',
+            field=models.DecimalField(blank=True, decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='top_bidder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='leading', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_current_bid, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.0.6 on 2026-10-18 18:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def drop_duplicate_watches(apps, schema_editor):
+    """ Keep the oldest row of each (user, listing) pair """
+    WatchList = apps.get_model("auctions", "WatchList")
+    seen = set()
+    for watch in WatchList.objects.order_by("id"):
+        key = (watch.user_id, watch.auc_list_id)
+        if key in seen:
+            watch.delete()
+        seen.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auctions', '0004_auctionlisting_current_bid'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_watches, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='watchlist',
+            constraint=models.UniqueConstraint(fields=('user', 'auc_list'), name='unique_watch'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.0.6 on 2026-10-18 19:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_history(apps, schema_editor):
+    """ Each existing Bid row becomes one ledger entry """
+    Bid = apps.get_model("auctions", "Bid")
+    BidHistory = apps.get_model("auctions", "BidHistory")
+    BidHistory.objects.bulk_create([
+        BidHistory(user_id=bid.user_id, auc_list_id=bid.auc_list_id, amount=bid.amount)
+        for bid in Bid.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0006_auctionlisting_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='last_bid_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='BidHistory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('auc_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bid_history', to='auctions.auctionlisting')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bid_history', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['auc_list', 'created'], name='bid_history_listing')],
+            },
+        ),
+        migrations.RunPython(seed_history, migrations.RunPython.noop),
+    ]
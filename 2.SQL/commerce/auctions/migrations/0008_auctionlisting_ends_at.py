@@ -0,0 +1,36 @@
+# Generated by Django 4.0.6 on 2026-10-18 20:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_winners(apps, schema_editor):
+    """ Listings closed before winners were stored """
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+    AuctionListing.objects.filter(active=False).update(winner=models.F("top_bidder"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0007_bidhistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='winner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='won', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='auctionlisting',
+            index=models.Index(fields=['active', 'ends_at'], name='listing_active_ends'),
+        ),
+        migrations.RunPython(set_winners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.6 on 2026-10-19 09:00
+
+from django.db import migrations
+from django.db.models import Max, OuterRef, Subquery
+
+
+def fill_last_bid_at(apps, schema_editor):
+    """ Listings with bids from before the ledger take their newest ledger time """
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+    BidHistory = apps.get_model("auctions", "BidHistory")
+    newest = (BidHistory.objects.filter(auc_list=OuterRef("pk")).order_by()
+              .values("auc_list").annotate(last=Max("created")).values("last"))
+    AuctionListing.objects.filter(last_bid_at__isnull=True, bid_count__gt=0).update(
+        last_bid_at=Subquery(newest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0009_comment_created'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_last_bid_at, migrations.RunPython.noop),
+    ]
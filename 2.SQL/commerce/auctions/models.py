@@ -1,7 +1,12 @@
 """ Django Models (Database) """
 
+from decimal import Decimal
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -20,23 +25,163 @@ class Category(models.Model):
     def __str__(self):
         return f"{self.category}"
 
+class KeysetQuerySet(models.QuerySet):
+    """ Keyset pagination, for any model with an id """
+
+    def keyset(self, field, descending=False, after=None, size=24):
+        """ Keyset page ordered by (field, id)
+        after is the (field value, id) of the last row already seen
+        Returns (rows, (field value, id) of the last row or None)
+        """
+        queryset = self
+        if after is not None:
+            value, last_id = after
+            lookup = "lt" if descending else "gt"
+            queryset = queryset.filter(Q(**{f"{field}__{lookup}": value})
+                                       | Q(**{field: value, f"id__{lookup}": last_id}))
+        sign = "-" if descending else ""
+        rows = list(queryset.order_by(f"{sign}{field}", f"{sign}id")[:size + 1])
+        if len(rows) > size:
+            last = rows[size - 1]
+            return rows[:size], (getattr(last, field), last.id)
+        return rows, None
+
+class AuctionListingQuerySet(KeysetQuerySet):
+    """ Listing queries shared by the catalogue pages """
+
+    def with_summary(self):
+        """ Owner, category, top bidder and comment count in the same query
+        The count is a correlated subquery rather than a GROUP BY, so a
+        page is still read off the index and counted row by row
+        """
+        comments = (Comment.objects.filter(auc_list=OuterRef("pk")).order_by()
+                    .values("auc_list").annotate(n=Count("id")).values("n"))
+        return (self.select_related("user", "category", "top_bidder")
+                .annotate(comment_count=Coalesce(Subquery(comments), 0)))
+
+    def page(self, after=None, size=24):
+        """ Keyset page of listings, newest first
+        Returns (listings, cursor for the next page or None)
+        """
+        queryset = self.filter(id__lt=after) if after is not None else self
+        listings = list(queryset.order_by("-id")[:size + 1])
+        if len(listings) > size:
+            return listings[:size], listings[size - 1].id
+        return listings, None
+
+    def close(self):
+        """ Close every listing in the queryset, the top bidder becomes the winner
+        A single UPDATE, the winner comes from the denormalized top_bidder
+        Returns the number of listings closed
+        """
+        return self.filter(active=True).update(active=False, winner=F("top_bidder"))
+
+    def close_expired(self, now=None, batch_size=500):
+        """ Close listings whose end time has passed, batch_size at a time
+        Returns the number of listings closed
+        """
+        from . import fragments  # pylint: disable=import-outside-toplevel
+        now = now or timezone.now()
+        closed = 0
+        while True:
+            ids = list(self.filter(active=True, ends_at__lte=now)
+                       .order_by("ends_at").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                return closed
+            closed += self.filter(id__in=ids).close()
+            fragments.invalidate_many(ids)
+
 class AuctionListing(models.Model):
     """ Auction Listing Table
     User_posted  name  price  Category  description  imgURL  active
+    current_price  bid_count  top_bidder  last_bid_at
+    (bid summary kept up to date by place_bid, rebuilt by rebuild_bid_summary)
+    ends_at  winner  (set when closed by the owner or close_expired_listings)
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="postings")
     name = models.CharField(max_length=64)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    current_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True)
+    bid_count = models.PositiveIntegerField(default=0)
+    top_bidder = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name="leading")
+    last_bid_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name="won")
     category = models.ForeignKey(Category,
                             on_delete=models.CASCADE,
                             related_name="category_listing")
     imgurl = models.URLField(max_length=255)
 
     active = models.BooleanField(default=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    objects = AuctionListingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # One index per catalogue sort order, active first for the usual filter
+            models.Index(fields=["active", "created", "id"], name="listing_active_created"),
+            models.Index(fields=["active", "current_price", "id"], name="listing_active_price"),
+            models.Index(fields=["category", "active", "created", "id"],
+                         name="listing_category_created"),
+            models.Index(fields=["active", "ends_at"], name="listing_active_ends"),
+        ]
 
     def __str__(self):
-        return f"{self.name} posted by {self.user}. Current price is ${self.price}"
+        return f"{self.name} posted by {self.user}. Current price is ${self.current_price}"
+
+    def serialize(self):
+        """ Serialize for JSON """
+        return {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "owner": self.user.nickname,
+            "category": self.category.category,
+            "price": str(self.current_price),
+            "bid_count": self.bid_count,
+            "imgurl": self.imgurl,
+            "active": self.active,
+            "created": self.created.isoformat(),
+            "ends_at": self.ends_at.isoformat() if self.ends_at else None
+        }
+
+    def save(self, *args, **kwargs):
+        # Bidding starts at the asking price
+        if self.current_price is None:
+            self.current_price = self.price
+        super().save(*args, **kwargs)
+
+    def min_bid(self):
+        """ Lowest amount the next bid may be """
+        if self.bid_count == 0:
+            return self.current_price
+        return self.current_price + Decimal("0.01")
+
+    def place_bid(self, user, amount):
+        """ Record a bid if it beats the current price
+        One conditional UPDATE, so of two concurrent bidders only the
+        higher one (or the first of two equal ones) can win
+        Returns True if the bid was accepted
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            beats = Q(current_price__lt=amount) | Q(bid_count=0, current_price__lte=amount)
+            still_open = Q(ends_at__isnull=True) | Q(ends_at__gt=now)
+            accepted = (AuctionListing.objects.filter(beats, still_open, id=self.id, active=True)
+                        .update(current_price=amount, bid_count=F("bid_count") + 1,
+                                top_bidder=user, last_bid_at=now))
+            if not accepted:
+                return False
+
+            BidHistory.objects.create(user=user, auc_list=self, amount=amount, created=now)
+            Bid.objects.update_or_create(user=user, auc_list=self, defaults={"amount": amount})
+
+        self.refresh_from_db(fields=["current_price", "bid_count", "top_bidder", "last_bid_at"])
+        return True
 
 class Bid(models.Model):
     """ Bids Table
@@ -49,13 +194,50 @@ class Bid(models.Model):
     def __str__(self):
         return f"Bid amount of {self.amount} by {self.user} for {self.auc_list}"
 
+class BidHistory(models.Model):
+    """ Bid Ledger Table, append only
+    User  AuctionListing  bid_amount  created
+    One row per accepted bid, Bid keeps only each user's latest
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bid_history")
+    auc_list = models.ForeignKey(AuctionListing, on_delete=models.CASCADE,
+                                 related_name="bid_history")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["auc_list", "created"], name="bid_history_listing"),
+        ]
+
+    def __str__(self):
+        return f"Bid amount of {self.amount} by {self.user} for {self.auc_list} at {self.created}"
+
 class Comment(models.Model):
     """ Comments Table
-    User  comment  Auctionlisting
+    User  comment  Auctionlisting  created
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     comment = models.TextField()
     auc_list = models.ForeignKey(AuctionListing, on_delete=models.CASCADE, related_name="comment")
+    created = models.DateTimeField(default=timezone.now)
+
+    objects = KeysetQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # A listing's comments in keyset order
+            models.Index(fields=["auc_list", "created", "id"], name="comment_listing_created"),
+        ]
+
+    def serialize(self):
+        """ Serialize for JSON """
+        return {
+            "id": self.id,
+            "user": self.user.nickname,
+            "comment": self.comment,
+            "created": self.created.isoformat()
+        }
 
     def __str__(self):
         return f"\"{self.comment}\" by {self.user} on {self.auc_list}"
@@ -67,5 +249,11 @@ class WatchList(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="watch")
     auc_list = models.ForeignKey(AuctionListing, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            # Also the index behind "is this user watching this listing?"
+            models.UniqueConstraint(fields=["user", "auc_list"], name="unique_watch"),
+        ]
+
     def __str__(self):
         return f"{self.auc_list} watched by {self.user}"
@@ -0,0 +1,47 @@
+// Load further pages of comments as the reader scrolls to the end of the list
+document.addEventListener('DOMContentLoaded', () => {
+  const more = document.querySelector('#more-comments');
+  if (!more) {
+    return;
+  }
+
+  const list = document.querySelector('#comments');
+  let cursor = more.dataset.cursor;
+  let loading = false;
+
+  const observer = new IntersectionObserver((entries) => {
+    if (!entries[0].isIntersecting || loading || !cursor) {
+      return;
+    }
+    loading = true;
+
+    fetch(`${more.dataset.url}?cursor=${encodeURIComponent(cursor)}`)
+      .then((response) => response.json())
+      .then((data) => {
+        data.results.forEach((comment) => {
+          const element = document.createElement('div');
+          element.className = 'comment-container';
+
+          const user = document.createElement('h5');
+          user.textContent = comment.user;
+          const text = document.createElement('p');
+          text.className = 'text-secondary';
+          text.textContent = comment.comment;
+
+          element.append(user, text, document.createElement('hr'));
+          list.append(element);
+        });
+
+        cursor = data.next;
+        if (!cursor) {
+          observer.disconnect();
+          more.remove();
+        }
+      })
+      .finally(() => {
+        loading = false;
+      });
+  });
+
+  observer.observe(more);
+});
@@ -1,3 +1,443 @@
-from django.test import TestCase
+""" Django Tests """
+# pylint: disable=no-member
+
+import json
+import base64
+import random
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from benchmarks.run import VIEWS, Scenarios, measure, compare
+from benchmarks.seed import seed
+from . import fragments
+from .views import PAGE_SIZE
+from .models import User, Category, AuctionListing, Bid, BidHistory, Comment, WatchList
+
+
+# Global Response Code
+SUCCESS_CODE = 200
+REDIRECT_CODE = 302
+NOT_FOUND_CODE = 404
+
+
+def make_listings(owner, category, count, comments=2):
+    """ Active listings, each with a bid and some comments """
+    for idx in range(count):
+        item = AuctionListing.objects.create(
+            user=owner, name=f"Item {idx}", description="", price=1,
+            category=category, imgurl="https://example.com/item.png")
+        item.place_bid(owner, Decimal("2.00"))
+        Comment.objects.bulk_create([Comment(user=owner, comment="Nice", auc_list=item)
+                                     for _ in range(comments)])
+
 
 # Create your tests here.
+class AuctionsTestCase(TestCase):
+    """ Auctions App Test """
+
+    def setUp(self):
+        """ Setting up testing Database """
+        cache.clear()
+
+        # Create some users
+        self.owner = User.objects.create_user(username="owner", nickname="owner", password="12345")
+        self.usr1 = User.objects.create_user(username="1", nickname="1", password="12345")
+        self.usr2 = User.objects.create_user(username="2", nickname="2", password="12345")
+
+        # Create a listing
+        self.category = Category.objects.create(category="Toys")
+        self.item = AuctionListing.objects.create(
+            user=self.owner, name="Ball", description="A ball", price=Decimal("10.00"),
+            category=self.category, imgurl="https://example.com/ball.png")
+
+    # Bid Placement Testing
+    def test_new_listing_price(self):
+        """ Bidding starts at the asking price """
+        self.assertEqual(self.item.current_price, Decimal("10.00"))
+        self.assertEqual(self.item.bid_count, 0)
+        self.assertEqual(self.item.min_bid(), Decimal("10.00"))
+
+    def test_place_bid(self):
+        """ Higher bids win, lower or equal bids are rejected """
+        self.assertTrue(self.item.place_bid(self.usr1, Decimal("10.00")))
+        self.assertFalse(self.item.place_bid(self.usr2, Decimal("10.00")))
+        self.assertTrue(self.item.place_bid(self.usr2, Decimal("12.50")))
+        self.assertFalse(self.item.place_bid(self.usr1, Decimal("11.00")))
+
+        item = AuctionListing.objects.get(id=self.item.id)
+        self.assertEqual(item.current_price, Decimal("12.50"))
+        self.assertEqual(item.bid_count, 2)
+        self.assertEqual(item.top_bidder, self.usr2)
+        self.assertEqual(item.min_bid(), Decimal("12.51"))
+        self.assertEqual(Bid.objects.filter(auc_list=item).count(), 2)
+
+    def test_bid_on_closed_listing(self):
+        """ Closed listings take no bids """
+        AuctionListing.objects.filter(id=self.item.id).update(active=False)
+        self.assertFalse(self.item.place_bid(self.usr1, Decimal("50.00")))
+
+    # Client Testing
+    def test_bid(self):
+        """ Test Bid View """
+        client = Client()
+        client.login(username="1", password="12345")
+
+        response = client.post("/bid", {"listing_id": self.item.id, "bidamount": "15"})
+        self.assertEqual(response.status_code, REDIRECT_CODE)
+        response = client.post("/bid", {"listing_id": self.item.id, "bidamount": "abc"})
+        self.assertEqual(response.status_code, REDIRECT_CODE)
+
+        item = AuctionListing.objects.get(id=self.item.id)
+        self.assertEqual(item.current_price, Decimal("15.00"))
+        self.assertEqual(item.top_bidder, self.usr1)
+
+    def test_bid_out_of_range(self):
+        """ Test Bids That Do Not Fit The Price Column Are Rejected """
+        client = Client()
+        client.login(username="1", password="12345")
+        client.post("/bid", {"listing_id": self.item.id, "bidamount": "12.00"})
+
+        for amount in ("1e20", "NaN", "12.005"):
+            response = client.post("/bid", {"listing_id": self.item.id, "bidamount": amount})
+            self.assertEqual(response.status_code, REDIRECT_CODE, amount)
+
+        item = AuctionListing.objects.get(id=self.item.id)
+        self.assertEqual(item.current_price, Decimal("12.00"))
+        self.assertEqual(item.bid_count, 1)
+        self.assertEqual(client.get(f"/listing/{self.item.id}").status_code, SUCCESS_CODE)
+
+    def test_listing_is_read_only(self):
+        """ Test Listing Page Never Writes """
+        self.item.place_bid(self.usr1, Decimal("20.00"))
+        client = Client()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f"/listing/{self.item.id}")
+        self.assertEqual(response.status_code, SUCCESS_CODE)
+        self.assertEqual(response.context["price"], Decimal("20.00"))
+        writes = [query["sql"] for query in queries.captured_queries
+                  if not query["sql"].startswith("SELECT")]
+        self.assertEqual(writes, [])
+
+    def test_listing_cache(self):
+        """ Test Listing Page Served From Cache Until It Changes """
+        client = Client()
+        client.login(username="1", password="12345")
+        client.get(f"/listing/{self.item.id}")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f"/listing/{self.item.id}")
+        self.assertNotIn("auctions_auctionlisting", "".join(
+            query["sql"] for query in queries.captured_queries))
+        self.assertContains(response, "A ball")
+
+        # Each of these moves the page on to a new version
+        client.post("/comment", {"listing_id": self.item.id, "commenting": "Bouncy"})
+        self.assertContains(client.get(f"/listing/{self.item.id}"), "Bouncy")
+        client.post("/bid", {"listing_id": self.item.id, "bidamount": "15"})
+        self.assertEqual(client.get(f"/listing/{self.item.id}").context["price"], Decimal("15.00"))
+
+        # Per-user bits are never shared
+        self.assertTrue(client.get(f"/listing/{self.item.id}").context["watching"])
+        client.login(username="2", password="12345")
+        self.assertFalse(client.get(f"/listing/{self.item.id}").context["watching"])
+
+    def test_listing_not_found(self):
+        """ Test Bad Listing Ids Are 404s, Malformed Ones Without Touching The Database """
+        client = Client()
+        client.login(username="1", password="12345")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get("/listing/abc").status_code, NOT_FOUND_CODE)
+            self.assertEqual(client.get("/addwatch/abc").status_code, NOT_FOUND_CODE)
+        self.assertEqual(queries.captured_queries, [])
+
+        missing = self.item.id + 100
+        self.assertEqual(client.get(f"/listing/{missing}").status_code, NOT_FOUND_CODE)
+        self.assertEqual(client.get(f"/addwatch/{missing}").status_code, NOT_FOUND_CODE)
+        response = client.post("/bid", {"listing_id": "abc", "bidamount": "15"})
+        self.assertEqual(response.status_code, NOT_FOUND_CODE)
+        response = client.post("/comment", {"listing_id": missing, "commenting": "Hi"})
+        self.assertEqual(response.status_code, NOT_FOUND_CODE)
+        response = client.get(f"/api/listings/{missing}/comments")
+        self.assertEqual(response.status_code, NOT_FOUND_CODE)
+
+        for category in ("abc", "999"):
+            response = client.post("/new", {"title": "Ball", "description": "A ball",
+                                            "price": "1", "category": category})
+            self.assertEqual(response.status_code, NOT_FOUND_CODE, category)
+        self.assertEqual(AuctionListing.objects.count(), 1)
+
+    def test_listing_watching(self):
+        """ Test Watch Flag On Listing Page """
+        client = Client()
+        client.login(username="1", password="12345")
+        response = client.get(f"/listing/{self.item.id}")
+        self.assertFalse(response.context["watching"])
+
+        # Adding twice keeps a single row
+        client.get(f"/addwatch/{self.item.id}")
+        client.get(f"/addwatch/{self.item.id}")
+        self.assertEqual(WatchList.objects.filter(user=self.usr1).count(), 1)
+
+        response = client.get(f"/listing/{self.item.id}")
+        self.assertTrue(response.context["watching"])
+
+    def test_watch(self):
+        """ Test Watch Page Query Count """
+        for idx in range(5):
+            item = AuctionListing.objects.create(
+                user=self.owner, name=f"Item {idx}", description="", price=1,
+                category=self.category, imgurl="https://example.com/item.png")
+            WatchList.objects.create(user=self.usr1, auc_list=item)
+
+        client = Client()
+        client.login(username="1", password="12345")
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/watch")
+            self.assertEqual(response.status_code, SUCCESS_CODE)
+        listing_queries = [query for query in queries.captured_queries
+                           if "auctions_auctionlisting" in query["sql"]]
+        self.assertEqual(len(listing_queries), 1)
+        self.assertEqual(len(response.context["auc_list"]), 5)
+
+    # Query Count Testing
+    def count_queries(self, url, data=None):
+        """ Queries issued by one anonymous request """
+        client = Client()
+        with CaptureQueriesContext(connection) as queries:
+            if data is None:
+                response = client.get(url)
+            else:
+                response = client.post(url, data)
+        self.assertEqual(response.status_code, SUCCESS_CODE)
+        return len(queries.captured_queries)
+
+    def test_index_query_count(self):
+        """ Index Page Queries Do Not Grow With Listings """
+        make_listings(self.owner, self.category, 2)
+        few = self.count_queries("/")
+        make_listings(self.owner, self.category, 20)
+        self.assertEqual(self.count_queries("/"), few)
+
+    def test_categories_query_count(self):
+        """ Category Page Queries Do Not Grow With Listings """
+        make_listings(self.owner, self.category, 2)
+        few = self.count_queries("/categories", {"category": self.category.id})
+        make_listings(self.owner, self.category, 20)
+        self.assertEqual(self.count_queries("/categories", {"category": self.category.id}), few)
+
+    def test_index_plan(self):
+        """ Index Page Is Read Off The Primary Key, No Grouping Or Sorting """
+        make_listings(self.owner, self.category, 3)
+        plan = (AuctionListing.objects.filter(active=True).with_summary()
+                .order_by("-id")[:PAGE_SIZE].explain())
+        self.assertNotIn("GROUP BY", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+        listings, _ = AuctionListing.objects.filter(active=True).with_summary().page(size=2)
+        self.assertEqual([listing.comment_count for listing in listings], [2, 2])
+        self.assertEqual(AuctionListing.objects.with_summary().get(id=self.item.id)
+                         .comment_count, 0)
+
+    def test_categories_not_found(self):
+        """ Unknown Or Malformed Categories Are 404s """
+        client = Client()
+        self.assertEqual(client.get("/categories?category=abc").status_code, NOT_FOUND_CODE)
+        self.assertEqual(client.get("/categories?category=999").status_code, NOT_FOUND_CODE)
+        self.assertEqual(client.post("/categories", {"category": "999"}).status_code,
+                         NOT_FOUND_CODE)
+
+    def test_index_pagination(self):
+        """ Keyset pages cover every listing exactly once """
+        make_listings(self.owner, self.category, 30, comments=0)
+        client = Client()
+        seen = []
+        url = "/"
+        while url:
+            response = client.get(url)
+            seen += [listing.id for listing in response.context["auc_list"]]
+            after = response.context["after"]
+            url = f"/?after={after}" if after else None
+        self.assertEqual(len(seen), 31)
+        self.assertEqual(seen, sorted(set(seen), reverse=True))
+
+    # Catalogue API Testing
+    def test_catalogue_pages(self):
+        """ Cursor pages walk every listing once in sort order """
+        make_listings(self.owner, self.category, 7, comments=0)
+        AuctionListing.objects.filter(name="Item 3").update(current_price=Decimal("2.00"))
+        client = Client()
+
+        for sort in ("newest", "oldest", "price_low", "price_high"):
+            seen = []
+            url = f"/api/listings?sort={sort}&limit=3"
+            while url:
+                data = client.get(url).json()
+                seen += [(Decimal(item["price"]), item["id"]) for item in data["results"]]
+                url = f"/api/listings?sort={sort}&limit=3&cursor={data['next']}" if data["next"] else None
+            self.assertEqual(len(seen), 8, sort)
+            if sort.startswith("price"):
+                self.assertEqual(seen, sorted(seen, reverse=sort == "price_high"), sort)
+
+    def test_catalogue_filters(self):
+        """ Category, price and active filters """
+        other = Category.objects.create(category="Books")
+        make_listings(self.owner, other, 3, comments=0)
+        AuctionListing.objects.filter(id=self.item.id).update(active=False)
+        client = Client()
+
+        data = client.get(f"/api/listings?category={other.id}").json()
+        self.assertEqual(len(data["results"]), 3)
+        self.assertIsNone(data["next"])
+
+        data = client.get("/api/listings?min_price=5").json()
+        self.assertEqual(data["results"], [])
+        data = client.get("/api/listings?min_price=5&active=false").json()
+        self.assertEqual([item["id"] for item in data["results"]], [self.item.id])
+
+        self.assertEqual(client.get("/api/listings?sort=best").status_code, 400)
+        self.assertEqual(client.get("/api/listings?cursor=nope").status_code, 400)
+        self.assertEqual(client.get("/api/listings?min_price=abc").status_code, 400)
+        self.assertEqual(client.get("/api/listings?min_price=NaN").status_code, 400)
+        self.assertEqual(client.get("/api/listings?max_price=NaN").status_code, 400)
+
+        # Well-formed tokens carrying the wrong kind of value
+        for sort, value in (("newest", 5), ("price_low", "NaN"), ("price_low", None)):
+            token = base64.urlsafe_b64encode(json.dumps([value, 1]).encode()).decode()
+            response = client.get(f"/api/listings?sort={sort}&cursor={token}")
+            self.assertEqual(response.status_code, 400, (sort, value))
+
+    # Comments API Testing
+    def test_listing_comments(self):
+        """ Listing page holds one page of comments, the API serves the rest in order """
+        Comment.objects.bulk_create([Comment(user=self.usr1, comment=f"Comment {idx}",
+                                             auc_list=self.item) for idx in range(45)])
+        client = Client()
+        response = client.get(f"/listing/{self.item.id}")
+        self.assertContains(response, "Comment 19")
+        self.assertNotContains(response, "Comment 20")
+
+        seen = []
+        url = f"/api/listings/{self.item.id}/comments?cursor={response.context['comments_next']}"
+        while url:
+            data = client.get(url).json()
+            seen += [comment["comment"] for comment in data["results"]]
+            url = (f"/api/listings/{self.item.id}/comments?cursor={data['next']}"
+                   if data["next"] else None)
+        self.assertEqual(seen, [f"Comment {idx}" for idx in range(20, 45)])
+        self.assertEqual(client.get(f"/api/listings/{self.item.id}/comments?cursor=x")
+                         .status_code, 400)
+
+    # Bid Ledger Testing
+    def test_bid_history(self):
+        """ Every accepted bid is appended to the ledger """
+        self.item.place_bid(self.usr1, Decimal("11.00"))
+        self.item.place_bid(self.usr1, Decimal("12.00"))
+        self.item.place_bid(self.usr2, Decimal("11.50"))
+        self.assertEqual(BidHistory.objects.filter(auc_list=self.item).count(), 2)
+        self.assertEqual(Bid.objects.filter(auc_list=self.item).count(), 1)
+        self.assertIsNotNone(self.item.last_bid_at)
+
+    def test_rebuild_bid_summary(self):
+        """ Summary columns are recomputed from the ledger """
+        self.item.place_bid(self.usr1, Decimal("11.00"))
+        self.item.place_bid(self.usr2, Decimal("13.00"))
+        expected = AuctionListing.objects.get(id=self.item.id)
+        empty = AuctionListing.objects.create(
+            user=self.owner, name="Empty", description="", price=Decimal("5.00"),
+            category=self.category, imgurl="https://example.com/item.png")
+
+        AuctionListing.objects.update(current_price=0, bid_count=99, top_bidder=None,
+                                      last_bid_at=None)
+        call_command("rebuild_bid_summary", stdout=StringIO())
+
+        item = AuctionListing.objects.get(id=self.item.id)
+        self.assertEqual(item.current_price, Decimal("13.00"))
+        self.assertEqual(item.bid_count, 2)
+        self.assertEqual(item.top_bidder, self.usr2)
+        self.assertEqual(item.last_bid_at, expected.last_bid_at)
+
+        empty.refresh_from_db()
+        self.assertEqual(empty.current_price, Decimal("5.00"))
+        self.assertEqual(empty.bid_count, 0)
+        self.assertIsNone(empty.top_bidder)
+
+    def test_rebuild_bid_summary_invalidates_pages(self):
+        """ Cached listing pages show the rebuilt price """
+        self.item.place_bid(self.usr1, Decimal("11.00"))
+        AuctionListing.objects.filter(id=self.item.id).update(current_price=Decimal("1.00"))
+        fragments.invalidate(self.item.id)
+        client = Client()
+        response = client.get(f"/listing/{self.item.id}")
+        self.assertEqual(response.context["price"], Decimal("1.00"))
+
+        call_command("rebuild_bid_summary", stdout=StringIO())
+        response = client.get(f"/listing/{self.item.id}")
+        self.assertEqual(response.context["price"], Decimal("11.00"))
+
+    # Closing Testing
+    def test_close_expired_listings(self):
+        """ Expired listings close in batches with their winners """
+        now = timezone.now()
+        make_listings(self.owner, self.category, 5, comments=0)
+        AuctionListing.objects.exclude(id=self.item.id).update(ends_at=now - timedelta(hours=1))
+        self.item.place_bid(self.usr1, Decimal("10.00"))
+        AuctionListing.objects.filter(id=self.item.id).update(ends_at=now + timedelta(hours=1))
+
+        call_command("close_expired_listings", "--batch-size", "2", stdout=StringIO())
+        self.assertEqual(AuctionListing.objects.filter(active=True).count(), 1)
+        self.assertEqual(set(AuctionListing.objects.filter(active=False)
+                             .values_list("winner", flat=True)), {self.owner.id})
+
+        # Later the remaining one expires too
+        closed = AuctionListing.objects.close_expired(now=now + timedelta(hours=2))
+        self.assertEqual(closed, 1)
+        self.assertEqual(AuctionListing.objects.get(id=self.item.id).winner, self.usr1)
+
+    def test_no_bids_after_end(self):
+        """ Bids past the end time are rejected before the sweep runs """
+        AuctionListing.objects.filter(id=self.item.id).update(
+            ends_at=timezone.now() - timedelta(minutes=1))
+        self.assertFalse(self.item.place_bid(self.usr1, Decimal("50.00")))
+
+    def test_close(self):
+        """ Test Owner Closing A Listing """
+        self.item.place_bid(self.usr1, Decimal("10.00"))
+        client = Client()
+        client.login(username="owner", password="12345")
+        client.get(f"/close/{self.item.id}")
+
+        client.login(username="1", password="12345")
+        response = client.get(f"/listing/{self.item.id}")
+        self.assertFalse(response.context["active"])
+        self.assertTrue(response.context["winner"])
+
+    # Benchmark Testing
+    def test_benchmark_smoke(self):
+        """ Benchmark seeding and every scenario run on a tiny data set """
+        AuctionListing.objects.all().delete()
+        user_ids = seed(users=3, listings=4, bids=3, comments=2, watches=2)
+        self.assertEqual(AuctionListing.objects.filter(bid_count=3).count(), 4)
+        self.assertEqual(BidHistory.objects.count(), 12)
+
+        listing_ids = list(AuctionListing.objects.values_list("id", flat=True))
+        scenarios = Scenarios(user_ids, listing_ids, random.Random(0))
+        for view in VIEWS:
+            result = measure(getattr(scenarios, view), requests=3, warmup=1)
+            self.assertGreaterEqual(result["queries"], result["queries_per_request"])
+
+    def test_benchmark_compare(self):
+        """ Query count and queries per request both gate a run """
+        baseline = {"p50_ms": 1.0, "p99_ms": 2.0, "queries": 5, "queries_per_request": 4.5}
+        self.assertEqual(compare(dict(baseline), baseline, 2.0), [])
+        result = dict(baseline, queries_per_request=4.8)
+        self.assertEqual(compare(result, baseline, 2.0, latency=False),
+                         ["queries_per_request 4.8 > 4.5"])
@@ -10,12 +10,17 @@ urlpatterns = [
     path("logout", views.logout_view, name="logout"),
     path("register", views.register, name="register"),
     path("new", views.new, name="new"),
-    path("listing/<str:listing_id>", views.listing, name="listing"),
+    path("listing/<int:listing_id>", views.listing, name="listing"),
     path("bid", views.bid, name="bid"),
     path("comment", views.comments, name="comment"),
     path("watch", views.watch, name="watch"),
-    path("delwatch/<str:listing_id>", views.delwatch, name="delwatch"),
-    path("addwatch/<str:listing_id>", views.addwatch, name="addwatch"),
-    path("close/<str:listing_id>", views.close, name="close"),
-    path("categories", views.categories, name="categories")
+    path("delwatch/<int:listing_id>", views.delwatch, name="delwatch"),
+    path("addwatch/<int:listing_id>", views.addwatch, name="addwatch"),
+    path("close/<int:listing_id>", views.close, name="close"),
+    path("categories", views.categories, name="categories"),
+
+    # API Routes
+    path("api/listings", views.catalogue, name="catalogue"),
+    path("api/listings/<int:listing_id>/comments", views.listing_comments,
+         name="listing_comments")
 ]
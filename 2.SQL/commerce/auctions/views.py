@@ -1,19 +1,52 @@
 """ View Functions """
 # pylint: disable=no-member
 
+import json
+import base64
+import binascii
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
 from django.contrib.auth import authenticate, login, logout
 from django.db import IntegrityError
-from django.shortcuts import render, redirect
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
 
-from .models import User, Category, AuctionListing, Bid, Comment, WatchList
-from .forms import NewListingForm
+from . import fragments
+from .models import User, Category, AuctionListing, Comment, WatchList
+from .forms import NewListingForm, BidForm
+
+
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Catalogue sort name -> (ordering field, descending), each backed by an index
+SORTS = {
+    "newest": ("created", True),
+    "oldest": ("created", False),
+    "price_low": ("current_price", False),
+    "price_high": ("current_price", True),
+}
+
+
+def cursor(request):
+    """ Keyset cursor from ?after=, None for the first page """
+    try:
+        return int(request.GET["after"])
+    except (KeyError, ValueError):
+        return None
 
 
 def index(request):
     """ Index View """
+    auc_list, after = (AuctionListing.objects.filter(active=True).with_summary()
+                       .page(cursor(request), PAGE_SIZE))
     return render(request, "auctions/index.html", {
-        "auc_list": AuctionListing.objects.filter(active=True)
+        "auc_list": auc_list,
+        "after": after
     })
 
 
@@ -92,8 +125,10 @@ def new(request):
             title = form.cleaned_data["title"]
             description = form.cleaned_data["description"]
             price = form.cleaned_data["price"]
-            category = Category.objects.get(id=request.POST["category"])
+            category = category_or_404(request.POST.get("category"))
             imgurl = form.cleaned_data["url"]
+            duration = form.cleaned_data["duration"]
+            ends_at = timezone.now() + timedelta(days=duration) if duration else None
 
             # Default
             if not imgurl:
@@ -101,7 +136,7 @@ def new(request):
 
             # Create new auction listing
             AuctionListing.objects.create(user=user, name=title, description=description,
-                price=price, category=category, imgurl=imgurl)
+                price=price, category=category, imgurl=imgurl, ends_at=ends_at)
 
             return redirect("index")
 
@@ -114,63 +149,49 @@ def new(request):
 
 def listing(request, listing_id):
     """ Listing Pages """
-    # Listing Info
+    # Shared part of the page, from cache unless the listing has changed
     user = request.user
-    item = AuctionListing.objects.get(id=listing_id)
-    comment = Comment.objects.filter(auc_list=listing_id)
-    price = item.price
-    minbid = price
-
-    # Check for bids on the item
-    bids = Bid.objects.filter(auc_list=listing_id)
-    bid_obj = None
-    if bids.exists():
-        bid_obj = bids.order_by('-amount').first()
-        item.price = bid_obj.amount
-        item.save()
-        minbid = float(price) + 0.01
+    item = fragments.listing_fragment(listing_id)
 
     # Check if user is waching this list
     # Check if user is the winner
     watching = False
     winner = False
     if user.is_authenticated:
-        watch_list = user.watch.all()
-        auc_list = [watch.auc_list for watch in watch_list]
-        if item in auc_list:
-            watching = True
+        watching = WatchList.objects.filter(user=user, auc_list=item["id"]).exists()
 
         # If listing is closed, check if current user is the winner
-        if not item.active and bid_obj is not None and bid_obj.user == user:
+        if not item["active"] and item["winner_id"] == user.id:
             winner = True
 
     # Render all Info
     return render(request, "auctions/listing.html", {
-        "id": item.id,
-        "owner": item.user,
-        "title": item.name,
-        "description": item.description,
-        "category": item.category,
-        "price": price,
-        "minbid": minbid,
-        "imgurl": item.imgurl,
-        "comments": comment,
+        "id": item["id"],
+        "is_owner": item["owner_id"] == user.id,
+        "header": item["header"],
+        "price": item["price"],
+        "minbid": item["minbid"],
+        "comments": item["comments"],
+        "comments_next": encode_cursor(item["comments_after"]) if item["comments_after"] else None,
         "watching": watching,
-        "active": item.active,
+        "active": item["active"],
         "winner": winner
     })
 
 
 def categories(request):
     """ Sort by Categories """
-    # POST
-    if request.method == "POST":
-        category = request.POST['category']
-        category_obj = Category.objects.get(id=category)
-        auc_list = category_obj.category_listing.filter(active=True)
+    # POST, or GET when following a next page link
+    category = request.POST.get('category') or request.GET.get('category')
+    if category:
+        category_obj = category_or_404(category)
+        auc_list, after = (category_obj.category_listing.filter(active=True).with_summary()
+                           .page(cursor(request), PAGE_SIZE))
 
         return render(request, "auctions/categories.html", {
             "auc_list":auc_list,
+            "after": after,
+            "selected": category_obj,
             "categories": Category.objects.all()
         })
 
@@ -180,36 +201,49 @@ def categories(request):
     })
 
 
+def category_or_404(value):
+    """ Category from a form or query value
+    Raises Http404 if the value is missing, malformed or names no category
+    """
+    try:
+        category_id = int(value)
+    except (TypeError, ValueError) as error:
+        raise Http404("No such category.") from error
+    return get_object_or_404(Category, id=category_id)
+
+
+def posted_listing(request):
+    """ Listing named by the listing_id form field, only its id is loaded
+    Raises Http404 if the field is missing, malformed or names no listing
+    """
+    try:
+        listing_id = int(request.POST["listing_id"])
+    except (KeyError, ValueError) as error:
+        raise Http404("No such listing.") from error
+    return get_object_or_404(AuctionListing.objects.only("id"), id=listing_id)
+
+
 @login_required(login_url="login")
 def bid(request):
     """ User Bid on an Item """
     # POST
     if request.method == "POST":
         # Info
-        listing_id = request.POST['listing_id']
-        bidamount = request.POST['bidamount']
+        item = posted_listing(request)
+        form = BidForm(request.POST)
+        if not form.is_valid():
+            return redirect("listing", item.id)
+        bidamount = form.cleaned_data["bidamount"]
 
-        # Update item price
-        item = AuctionListing.objects.get(id=listing_id)
-        item.price = bidamount
-        item.save()
+        # Raise the price only if the bid beats it
+        if not item.place_bid(request.user, bidamount):
+            return redirect("listing", item.id)
+        fragments.invalidate(item.id)
 
         # Automatically add to watch list if yet watched
-        if not WatchList.objects.filter(user=request.user, auc_list=listing_id).exists():
-            WatchList.objects.create(user=request.user, auc_list=item)
-
-        # If alrerady exists, update amount
-        if Bid.objects.filter(user=request.user, auc_list=listing_id).exists():
-            bid_in_db = Bid.objects.get(user=request.user, auc_list=listing_id)
-            bid_in_db.amount = bidamount
-            bid_in_db.save()
-            return redirect("listing", listing_id)
+        WatchList.objects.get_or_create(user=request.user, auc_list=item)
 
-        # Otherwise create new bid for the user
-        Bid.objects.create(
-            user=request.user, auc_list=item, amount=bidamount)
-
-        return redirect("listing", listing_id)
+        return redirect("listing", item.id)
 
     # GET
     return redirect("index")
@@ -220,13 +254,13 @@ def comments(request):
     """ User Comment on an Item """
     if request.method == "POST":
         # Info
-        listing_id = request.POST['listing_id']
+        item = posted_listing(request)
         commenting = request.POST['commenting']
 
-        # Find the item, add comment
-        item = AuctionListing.objects.get(id=listing_id)
+        # Add comment
         Comment.objects.create(user=request.user, comment=commenting, auc_list=item)
-        return redirect("listing", listing_id)
+        fragments.invalidate(item.id)
+        return redirect("listing", item.id)
 
     return redirect("index")
 
@@ -236,10 +270,9 @@ def watch(request):
     """ Watch List """
     # Info
     user = request.user
-    watch_list = user.watch.all()
 
-    # Extract auction listings from watch list
-    auc_list = [watch.auc_list for watch in watch_list]
+    # Watched auction listings, with their categories, in one query
+    auc_list = AuctionListing.objects.filter(watchlist__user=user).select_related("category")
 
     return render(request, "auctions/watch.html", {
         "owner": user,
@@ -257,8 +290,8 @@ def delwatch(request, listing_id):
 @login_required(login_url="login")
 def addwatch(request, listing_id):
     """ Add to Watch List """
-    item = AuctionListing.objects.get(id=listing_id)
-    WatchList.objects.create(user=request.user, auc_list=item)
+    item = get_object_or_404(AuctionListing.objects.only("id"), id=listing_id)
+    WatchList.objects.get_or_create(user=request.user, auc_list=item)
     return redirect("watch")
 
 
@@ -266,9 +299,107 @@ def addwatch(request, listing_id):
 def close(request, listing_id):
     """ Owner close Listing """
     owner = request.user
-    item = AuctionListing.objects.filter(id=listing_id, user=owner).first()
-    if item is not None:
-        item.active = False
-        item.save()
+    if AuctionListing.objects.filter(id=listing_id, user=owner).close():
+        fragments.invalidate(listing_id)
 
     return redirect("listing", listing_id)
+
+
+def encode_cursor(position):
+    """ (field value, id) -> opaque URL-safe token """
+    value, last_id = position
+    raw = json.dumps([str(value) if isinstance(value, Decimal) else value.isoformat(), last_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def parse_price(text):
+    """ Finite Decimal from text, ValueError otherwise """
+    try:
+        value = Decimal(text)
+    except InvalidOperation as error:
+        raise ValueError(f"{text!r} is not a number.") from error
+    if not value.is_finite():
+        raise ValueError(f"{text!r} is not a number.")
+    return value
+
+
+def decode_cursor(token, field):
+    """ Opaque token -> (field value, id), ValueError if malformed """
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as error:
+        raise ValueError("Invalid cursor.") from error
+    if not isinstance(value, str):
+        raise ValueError("Invalid cursor.")
+    if field == "created":
+        value = parse_datetime(value)
+    else:
+        value = parse_price(value)
+    if value is None or not isinstance(last_id, int):
+        raise ValueError("Invalid cursor.")
+    return value, last_id
+
+
+def catalogue(request):
+    """ Catalogue API
+    GET /api/listings?category=&min_price=&max_price=&active=&sort=&limit=&cursor=
+    Returns a keyset page of listings and the cursor for the next page
+    """
+    params = request.GET
+    sort = params.get("sort", "newest")
+    if sort not in SORTS:
+        return JsonResponse({"error": f"Invalid sort, use one of {', '.join(SORTS)}."},
+                            status=400)
+    field, descending = SORTS[sort]
+
+    listings = AuctionListing.objects.all()
+
+    # Filters
+    active = params.get("active", "true")
+    if active not in ("true", "false", "all"):
+        return JsonResponse({"error": "active must be true, false or all."}, status=400)
+    if active != "all":
+        listings = listings.filter(active=active == "true")
+    try:
+        if params.get("category"):
+            listings = listings.filter(category=int(params["category"]))
+        if params.get("min_price"):
+            listings = listings.filter(current_price__gte=parse_price(params["min_price"]))
+        if params.get("max_price"):
+            listings = listings.filter(current_price__lte=parse_price(params["max_price"]))
+        limit = min(int(params.get("limit", PAGE_SIZE)), MAX_PAGE_SIZE)
+        after = decode_cursor(params["cursor"], field) if params.get("cursor") else None
+    except ValueError as error:
+        return JsonResponse({"error": f"Invalid parameter: {error}"}, status=400)
+    if limit < 1:
+        return JsonResponse({"error": "limit must be positive."}, status=400)
+
+    page, position = (listings.select_related("user", "category")
+                      .keyset(field, descending, after, limit))
+    return JsonResponse({
+        "results": [item.serialize() for item in page],
+        "next": encode_cursor(position) if position is not None else None
+    })
+
+
+def listing_comments(request, listing_id):
+    """ Comments API
+    GET /api/listings/<id>/comments?limit=&cursor=
+    Returns a keyset page of comments, oldest first, and the cursor for the next page
+    """
+    params = request.GET
+    try:
+        limit = min(int(params.get("limit", fragments.COMMENT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        after = decode_cursor(params["cursor"], "created") if params.get("cursor") else None
+    except ValueError as error:
+        return JsonResponse({"error": f"Invalid parameter: {error}"}, status=400)
+    if limit < 1:
+        return JsonResponse({"error": "limit must be positive."}, status=400)
+
+    get_object_or_404(AuctionListing.objects.only("id"), id=listing_id)
+    page, position = (Comment.objects.filter(auc_list=listing_id).select_related("user")
+                      .keyset("created", after=after, size=limit))
+    return JsonResponse({
+        "results": [comment.serialize() for comment in page],
+        "next": encode_cursor(position) if position is not None else None
+    })
@@ -0,0 +1,6 @@
+""" Commerce Benchmarks
+
+python -m benchmarks [--listings N] [--update-baselines]
+Seeds a throwaway test database, drives the auctions views through the
+test client and compares latency and query counts with baselines.json
+"""
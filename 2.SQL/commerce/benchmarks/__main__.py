@@ -0,0 +1,95 @@
+""" python -m benchmarks, run from 2.SQL/commerce """
+
+import os
+import sys
+import json
+import random
+import argparse
+
+import django
+
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmark the auctions views")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--listings", type=int, default=1000)
+    parser.add_argument("--bids", type=int, default=5, help="per listing")
+    parser.add_argument("--comments", type=int, default=10, help="per listing")
+    parser.add_argument("--watches", type=int, default=20, help="per user")
+    parser.add_argument("--requests", type=int, default=200, help="per view")
+    parser.add_argument("--tolerance", type=float, default=2.0,
+                        help="latency may reach baseline times this")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="store this run as the new baselines")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """ Seed, measure, compare, exit non-zero on any regression """
+    args = parse_args(argv)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "commerce.settings")
+    django.setup()
+
+    # pylint: disable=import-outside-toplevel
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    from auctions.models import AuctionListing
+    from .run import VIEWS, Scenarios, measure, compare
+    from .seed import seed
+
+    scale = {key: getattr(args, key)
+             for key in ("users", "listings", "bids", "comments", "watches")}
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        cache.clear()
+        rng = random.Random(0)
+        user_ids = seed(rng=rng, **scale)
+        listing_ids = list(AuctionListing.objects.values_list("id", flat=True))
+        scenarios = Scenarios(user_ids, listing_ids, rng)
+        results = {view: measure(getattr(scenarios, view), args.requests) for view in VIEWS}
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    if args.update_baselines:
+        with open(BASELINES, "w", encoding="utf-8") as file:
+            json.dump({"scale": scale, "views": results}, file, indent=4)
+            file.write("\n")
+
+    try:
+        with open(BASELINES, encoding="utf-8") as file:
+            baselines = json.load(file)
+    except FileNotFoundError:
+        baselines = {"scale": scale, "views": {}}
+
+    # Query counts must hold at any scale, latency is only comparable at the baseline's
+    latency = baselines["scale"] == scale
+    if not latency:
+        print("Scale differs from the baselines, comparing query counts only")
+
+    print(f"{'view':<10}{'p50 ms':>10}{'p99 ms':>10}{'queries':>10}{'q/req':>10}")
+    failed = False
+    for view, result in results.items():
+        print(f"{view:<10}{result['p50_ms']:>10}{result['p99_ms']:>10}"
+              f"{result['queries']:>10}{result['queries_per_request']:>10}")
+        baseline = baselines["views"].get(view)
+        if baseline is None:
+            print(f"  no baseline for {view}")
+            continue
+        for failure in compare(result, baseline, args.tolerance, latency):
+            print(f"  REGRESSION {failure}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
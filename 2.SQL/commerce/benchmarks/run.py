@@ -0,0 +1,92 @@
+""" Timed, Query-Counted Requests Against the Auctions Views """
+# pylint: disable=no-member
+
+import math
+import time
+from decimal import Decimal
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from auctions.models import User
+
+
+def percentile(samples, pct):
+    """ Nearest-rank percentile of a non-empty list """
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+class Scenarios:
+    """ One method per benchmarked view, each makes a single request """
+
+    def __init__(self, user_ids, listing_ids, rng):
+        self.listing_ids = listing_ids
+        self.rng = rng
+        self.anonymous = Client()
+        self.member = Client()
+        self.member.force_login(User.objects.get(id=user_ids[0]))
+        self.bids = 0
+
+    def index(self):
+        """ Front page, anonymous """
+        return self.anonymous.get("/")
+
+    def listing(self):
+        """ A random listing page, signed in """
+        return self.member.get(f"/listing/{self.rng.choice(self.listing_ids)}")
+
+    def bid(self):
+        """ A bid on a random listing """
+        # Always beats the seeded prices, so every bid is accepted
+        self.bids += 1
+        return self.member.post("/bid", {"listing_id": self.rng.choice(self.listing_ids),
+                                         "bidamount": str(Decimal(1000 + self.bids))})
+
+    def watch(self):
+        """ The signed in user's watch list """
+        return self.member.get("/watch")
+
+
+VIEWS = ["index", "listing", "bid", "watch"]
+
+
+def measure(request, requests=200, warmup=10):
+    """ Run request() repeatedly
+    Returns p50/p99 latency in ms and the mean and max queries per request
+    """
+    for _ in range(warmup):
+        request()
+
+    timings = []
+    queries = []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = request()
+            timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{request.__name__} returned {response.status_code}")
+        queries.append(len(captured.captured_queries))
+
+    return {
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "queries": max(queries),
+        "queries_per_request": round(sum(queries) / len(queries), 2),
+    }
+
+
+def compare(result, baseline, tolerance, latency=True):
+    """ Regressions of one view's result against its baseline, as messages """
+    failures = []
+    for key in ("queries", "queries_per_request"):
+        if result[key] > baseline[key]:
+            failures.append(f"{key} {result[key]} > {baseline[key]}")
+    if latency:
+        for key in ("p50_ms", "p99_ms"):
+            limit = baseline[key] * tolerance
+            if result[key] > limit:
+                failures.append(f"{key} {result[key]} > {limit:.2f}")
+    return failures
@@ -0,0 +1,81 @@
+""" Bulk Seeding of Benchmark Data """
+# pylint: disable=no-member
+
+import random
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.utils import timezone
+
+from auctions.models import (User, Category, AuctionListing, Bid, BidHistory,
+                             Comment, WatchList)
+
+
+PASSWORD = "12345"
+BATCH_SIZE = 1000
+CATEGORIES = ["Toys", "Books", "Fashion", "Electronics", "Home", "Sports"]
+
+
+def seed(users=100, listings=1000, bids=5, comments=10, watches=20, rng=None):
+    """ Fill an empty database, every table written with bulk_create
+    bids, comments and watches are per listing, per listing, per user
+    Returns the list of user ids
+    """
+    rng = rng or random.Random(0)
+    now = timezone.now()
+
+    # One hash shared by every user, hashing is deliberately slow
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(username=f"user{idx}", nickname=f"user{idx}", password=password)
+        for idx in range(users)
+    ], batch_size=BATCH_SIZE)
+    user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+
+    Category.objects.bulk_create([Category(category=name) for name in CATEGORIES])
+    category_ids = list(Category.objects.values_list("id", flat=True))
+
+    AuctionListing.objects.bulk_create([
+        AuctionListing(user_id=rng.choice(user_ids), name=f"Item {idx}",
+                       description=f"Description of item {idx}", price=Decimal("1.00"),
+                       current_price=Decimal("1.00"), category_id=rng.choice(category_ids),
+                       imgurl="https://example.com/item.png",
+                       created=now - timedelta(minutes=listings - idx))
+        for idx in range(listings)
+    ], batch_size=BATCH_SIZE)
+    listing_ids = list(AuctionListing.objects.order_by("id").values_list("id", flat=True))
+
+    # Rising bids into the ledger, each bidder's latest into Bid
+    history = []
+    latest = {}
+    for listing_id in listing_ids:
+        for step in range(bids):
+            user_id = rng.choice(user_ids)
+            amount = Decimal(2 + step)
+            history.append(BidHistory(user_id=user_id, auc_list_id=listing_id, amount=amount,
+                                      created=now - timedelta(seconds=bids - step)))
+            latest[(user_id, listing_id)] = amount
+    BidHistory.objects.bulk_create(history, batch_size=BATCH_SIZE)
+    Bid.objects.bulk_create([
+        Bid(user_id=user_id, auc_list_id=listing_id, amount=amount)
+        for (user_id, listing_id), amount in latest.items()
+    ], batch_size=BATCH_SIZE)
+
+    Comment.objects.bulk_create([
+        Comment(user_id=rng.choice(user_ids), auc_list_id=listing_id, comment=f"Comment {idx}")
+        for listing_id in listing_ids for idx in range(comments)
+    ], batch_size=BATCH_SIZE)
+
+    WatchList.objects.bulk_create([
+        WatchList(user_id=user_id, auc_list_id=listing_id)
+        for user_id in user_ids
+        for listing_id in rng.sample(listing_ids, min(watches, len(listing_ids)))
+    ], batch_size=BATCH_SIZE)
+
+    # Summary columns from the ledger, the same way production repairs them
+    call_command("rebuild_bid_summary", verbosity=0, stdout=StringIO())
+    return user_ids
+
@@ -122,3 +122,17 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 DEFAULT_AUTO_FIELD='django.db.models.AutoField'
+
+
+# Caching
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# Listing pages are cached per listing and invalidated on bids, comments and
+# closing; use a shared cache (Memcached, Redis) when running more than one process
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+LISTING_CACHE_TIMEOUT = 300
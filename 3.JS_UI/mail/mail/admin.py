@@ -1,8 +1,9 @@
 """ Register models """
 
 from django.contrib import admin
-from .models import User, Email
+from .models import User, Message, Delivery
 
 # Register your models here.
 admin.site.register(User)
-admin.site.register(Email)
+admin.site.register(Message)
+admin.site.register(Delivery)
@@ -0,0 +1,138 @@
+# Generated by Django 4.0.6 on 2026-10-18 21:00
+
+from datetime import timedelta
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Legacy compose saved one Email per user a few milliseconds apart; rows
+# with the same content and recipients this close together were one send
+GROUP_WINDOW = timedelta(seconds=2)
+BATCH_SIZE = 1000
+
+
+def copy_emails(apps, schema_editor):
+    """ Each group of old per-user Email rows becomes one Message and its deliveries """
+    Email = apps.get_model("mail", "Email")
+    Message = apps.get_model("mail", "Message")
+    Delivery = apps.get_model("mail", "Delivery")
+    EmailRecipients = Email.recipients.through
+    MessageRecipients = Message.recipients.through
+
+    def write(groups):
+        """ Messages, their recipient rows and deliveries, a batch at a time """
+        messages = Message.objects.bulk_create([
+            Message(sender_id=group["sender"], subject=group["subject"], body=group["body"],
+                    timestamp=group["timestamp"])
+            for group in groups
+        ], batch_size=BATCH_SIZE)
+        MessageRecipients.objects.bulk_create([
+            MessageRecipients(message_id=message.id, user_id=user_id)
+            for message, group in zip(messages, groups)
+            for user_id in group["recipients"]
+        ], batch_size=BATCH_SIZE)
+        deliveries = []
+        for message, group in zip(messages, groups):
+            for email in group["emails"]:
+                if email.user_id == email.sender_id:
+                    deliveries.append(Delivery(user_id=email.user_id, message=message,
+                                               folder="sent", read=email.read,
+                                               archived=email.archived))
+                if email.user_id in group["recipients"]:
+                    deliveries.append(Delivery(user_id=email.user_id, message=message,
+                                               folder="inbox", read=email.read,
+                                               archived=email.archived))
+        Delivery.objects.bulk_create(deliveries, batch_size=BATCH_SIZE)
+
+    # Groups still collecting rows, by content and recipient set
+    open_groups = {}
+    closed = []
+
+    def close_before(timestamp):
+        for key, group in list(open_groups.items()):
+            if timestamp is None or timestamp - group["timestamp"] > GROUP_WINDOW:
+                closed.append(open_groups.pop(key))
+
+    def add_batch(batch):
+        recipients = {}
+        for email_id, user_id in (EmailRecipients.objects
+                                  .filter(email_id__in=[email.id for email in batch])
+                                  .values_list("email_id", "user_id")):
+            recipients.setdefault(email_id, set()).add(user_id)
+        for email in batch:
+            users = frozenset(recipients.get(email.id, ()))
+            key = (email.sender_id, email.subject, email.body, users)
+            group = open_groups.get(key)
+            if (group is None or email.timestamp - group["timestamp"] > GROUP_WINDOW
+                    or email.user_id in group["users"]):
+                if group is not None:
+                    closed.append(group)
+                group = open_groups[key] = {
+                    "sender": email.sender_id, "subject": email.subject, "body": email.body,
+                    "recipients": users, "timestamp": email.timestamp,
+                    "emails": [], "users": set(),
+                }
+            group["emails"].append(email)
+            group["users"].add(email.user_id)
+        close_before(batch[-1].timestamp)
+
+    batch = []
+    for email in Email.objects.order_by("timestamp", "id").iterator(chunk_size=BATCH_SIZE):
+        batch.append(email)
+        if len(batch) == BATCH_SIZE:
+            add_batch(batch)
+            batch = []
+        if len(closed) >= BATCH_SIZE:
+            write(closed)
+            closed.clear()
+    if batch:
+        add_batch(batch)
+    close_before(None)
+    if closed:
+        write(closed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mail', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Message',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('recipients', models.ManyToManyField(related_name='messages_received', to=settings.AUTH_USER_MODEL)),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='messages_sent', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('folder', models.CharField(choices=[('inbox', 'Inbox'), ('sent', 'Sent')], max_length=5)),
+                ('read', models.BooleanField(default=False)),
+                ('archived', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to=settings.AUTH_USER_MODEL)),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='mail.message')),
+            ],
+            options={
+                'verbose_name_plural': 'deliveries',
+            },
+        ),
+        migrations.RunPython(copy_emails, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='Email',
+        ),
+        migrations.AddConstraint(
+            model_name='delivery',
+            constraint=models.UniqueConstraint(fields=('user', 'message', 'folder'), name='unique_delivery'),
+        ),
+    ]
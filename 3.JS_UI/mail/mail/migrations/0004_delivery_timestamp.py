@@ -0,0 +1,37 @@
+# Generated by Django 4.0.6 on 2026-10-18 22:00
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_timestamps(apps, schema_editor):
+    """ Each delivery takes its message's timestamp """
+    Delivery = apps.get_model("mail", "Delivery")
+    Message = apps.get_model("mail", "Message")
+    Delivery.objects.update(timestamp=Subquery(
+        Message.objects.filter(id=OuterRef("message_id")).values("timestamp")[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mail', '0003_user_email_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_timestamps, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['user', 'folder', 'archived', 'timestamp', 'id'], name='delivery_mailbox'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['user', 'folder', 'timestamp', 'id'], name='delivery_folder'),
+        ),
+    ]
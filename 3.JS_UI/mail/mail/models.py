@@ -3,35 +3,106 @@
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Substr
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+# Characters of the body shown in mailbox lists
+SNIPPET_LENGTH = 100
 
 
 class User(AbstractUser):
     """ Users """
-    pass
+    # Indexed, compose looks recipients up by address
+    email = models.EmailField(_("email address"), blank=True, db_index=True)
 
 
-class Email(models.Model):
-    """ Emails """
-    user = models.ForeignKey("User", on_delete=models.CASCADE, related_name="emails")
-    sender = models.ForeignKey("User", on_delete=models.PROTECT, related_name="emails_sent")
-    recipients = models.ManyToManyField("User", related_name="emails_received")
+class Message(models.Model):
+    """ Email content, stored once however many people it was sent to """
+    sender = models.ForeignKey("User", on_delete=models.PROTECT, related_name="messages_sent")
+    recipients = models.ManyToManyField("User", related_name="messages_received")
     subject = models.CharField(max_length=255)
     body = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Sender: {self.sender}, Subject: {self.subject}"
+
+
+class DeliveryQuerySet(models.QuerySet):
+    """ Mailbox queries """
+
+    def with_message(self):
+        """ Message, sender and recipients in a fixed number of queries """
+        return (self.select_related("message__sender")
+                .prefetch_related("message__recipients"))
+
+    def summaries(self):
+        """ Header fields and a snippet of the body, never the body itself """
+        return (self.select_related("message__sender")
+                .only("read", "archived", "timestamp",
+                      "message__subject", "message__sender__email")
+                .annotate(snippet=Substr("message__body", 1, SNIPPET_LENGTH))
+                .prefetch_related(models.Prefetch("message__recipients",
+                                                  queryset=User.objects.only("email"))))
+
+
+class Delivery(models.Model):
+    """ One user's copy of a message, its folder and read/archived flags """
+    INBOX = "inbox"
+    SENT = "sent"
+    FOLDERS = [(INBOX, "Inbox"), (SENT, "Sent")]
+
+    user = models.ForeignKey("User", on_delete=models.CASCADE, related_name="deliveries")
+    message = models.ForeignKey("Message", on_delete=models.CASCADE, related_name="deliveries")
+    folder = models.CharField(max_length=5, choices=FOLDERS)
     read = models.BooleanField(default=False)
     archived = models.BooleanField(default=False)
+    # Copy of message.timestamp, so a mailbox page is read off one index
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    objects = DeliveryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "deliveries"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "message", "folder"], name="unique_delivery"),
+        ]
+        indexes = [
+            # Inbox and archive pages, newest first
+            models.Index(fields=["user", "folder", "archived", "timestamp", "id"],
+                         name="delivery_mailbox"),
+            # Sent pages, which include archived copies
+            models.Index(fields=["user", "folder", "timestamp", "id"], name="delivery_folder"),
+        ]
 
     def __str__(self):
-        return f"Sender: {self.sender}, Subject: {self.subject}"
+        return f"{self.message} in {self.user}'s {self.folder}"
 
     def serialize(self):
         """ Serialize for JSON """
+        message = self.message
+        return {
+            "id": self.id,
+            "sender": message.sender.email,
+            "recipients": [user.email for user in message.recipients.all()],
+            "subject": message.subject,
+            "body": message.body,
+            "timestamp": self.timestamp.strftime("%b %d %Y, %I:%M %p"),
+            "read": self.read,
+            "archived": self.archived
+        }
+
+    def summarize(self):
+        """ Serialize for the mailbox list, needs DeliveryQuerySet.summaries() """
+        message = self.message
         return {
             "id": self.id,
-            "sender": self.sender.email,
-            "recipients": [user.email for user in self.recipients.all()],
-            "subject": self.subject,
-            "body": self.body,
+            "sender": message.sender.email,
+            "recipients": [user.email for user in message.recipients.all()],
+            "subject": message.subject,
+            "snippet": self.snippet,
             "timestamp": self.timestamp.strftime("%b %d %Y, %I:%M %p"),
             "read": self.read,
             "archived": self.archived
@@ -67,10 +67,20 @@ function load_mailbox(mailbox) {
   // Show the mailbox name
   document.querySelector('#emails-view').innerHTML = `<h3>${mailbox.charAt(0).toUpperCase() + mailbox.slice(1)}</h3>`;
 
-  fetch(`/emails/${mailbox}`)
+  load_page(mailbox, null);
+}
+
+function load_page(mailbox, cursor) {
+
+  // One page of the mailbox, newest first, headers only
+  let url = `/emails/${mailbox}?view=summary`;
+  if (cursor) {
+    url += `&cursor=${encodeURIComponent(cursor)}`;
+  }
+  fetch(url)
   .then(response => response.json())
-  .then(emails => {
-    emails.forEach(email => {
+  .then(page => {
+    page.results.forEach(email => {
       // Data
       const id = email['id'];
       const sender = email['sender'];
@@ -111,6 +121,18 @@ function load_mailbox(mailbox) {
       emailDiv.addEventListener('click', () => view_email(id, mailbox==="sent"));
       document.querySelector('#emails-view').append(emailDiv);
     });
+
+    // Older emails on request
+    if (page.next) {
+      const more_btn = document.createElement('button');
+      more_btn.innerHTML = 'Load More';
+      more_btn.classList.add('btn', 'btn-secondary', 'd-block', 'mx-auto', 'my-3');
+      more_btn.addEventListener('click', () => {
+        more_btn.remove();
+        load_page(mailbox, page.next);
+      });
+      document.querySelector('#emails-view').append(more_btn);
+    }
   }).catch(error => console.log(error));
 }
 
@@ -281,28 +303,31 @@ function reply_email(email_id) {
 
 /* JSON
 Emails:
-[
-    {
-        "id": 100,
-        "sender": "foo@example.com",
-        "recipients": ["bar@example.com"],
-        "subject": "Hello!",
-        "body": "Hello, world!",
-        "timestamp": "Jan 2 2020, 12:00 AM",
-        "read": false,
-        "archived": false
-    },
-    {
-        "id": 95,
-        "sender": "baz@example.com",
-        "recipients": ["bar@example.com"],
-        "subject": "Meeting Tomorrow",
-        "body": "What time are we meeting?",
-        "timestamp": "Jan 1 2020, 12:00 AM",
-        "read": true,
-        "archived": false
-    }
-]
+{
+    "results": [
+        {
+            "id": 100,
+            "sender": "foo@example.com",
+            "recipients": ["bar@example.com"],
+            "subject": "Hello!",
+            "body": "Hello, world!",
+            "timestamp": "Jan 2 2020, 12:00 AM",
+            "read": false,
+            "archived": false
+        },
+        {
+            "id": 95,
+            "sender": "baz@example.com",
+            "recipients": ["bar@example.com"],
+            "subject": "Meeting Tomorrow",
+            "body": "What time are we meeting?",
+            "timestamp": "Jan 1 2020, 12:00 AM",
+            "read": true,
+            "archived": false
+        }
+    ],
+    "next": "WyIyMDIwLTAxLTAxVDAwOjAwOjAwKzAwOjAwIiwgOTVd"
+}
 
 Email:
 {
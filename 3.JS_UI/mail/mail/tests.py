@@ -1,3 +1,239 @@
-from django.test import TestCase
+""" Django Tests """
+# pylint: disable=no-member
+
+import json
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import User, Message, Delivery
+from .views import MAX_BULK_IDS
+
+
+# Global Response Code
+SUCCESS_CODE = 200
+CREATED_CODE = 201
+NO_CONTENT_CODE = 204
+BAD_REQUEST_CODE = 400
+
 
 # Create your tests here.
+class MailTestCase(TestCase):
+    """ Mail App Test """
+
+    def setUp(self):
+        """ Setting up testing Database """
+
+        # Create some users, the username is the email address
+        password = make_password("12345")
+        User.objects.bulk_create([User(username=f"user{idx}@example.com",
+                                       email=f"user{idx}@example.com", password=password)
+                                  for idx in range(60)])
+        self.users = list(User.objects.order_by("id"))
+        self.sender = self.users[0]
+        self.client = Client()
+        self.client.force_login(self.sender)
+
+    def send(self, recipients, subject="Hello", body="Hello, world!"):
+        """ POST a new email from the sender """
+        return self.client.post("/emails", json.dumps({
+            "recipients": ", ".join(recipients),
+            "subject": subject,
+            "body": body
+        }), content_type="application/json")
+
+    # Compose Testing
+    def test_compose_fan_out(self):
+        """ One message, one delivery per participant """
+        recipients = [user.email for user in self.users[1:51]]
+        response = self.send(recipients)
+        self.assertEqual(response.status_code, CREATED_CODE)
+
+        self.assertEqual(Message.objects.count(), 1)
+        message = Message.objects.get()
+        self.assertEqual(message.recipients.count(), 50)
+        self.assertEqual(Delivery.objects.filter(folder=Delivery.INBOX).count(), 50)
+        self.assertEqual(Delivery.objects.filter(folder=Delivery.SENT).get().user, self.sender)
+
+    def test_compose_inserts(self):
+        """ Inserting deliveries does not grow with the recipient count """
+        def inserts(count):
+            recipients = [user.email for user in self.users[1:count + 1]]
+            with CaptureQueriesContext(connection) as queries:
+                self.send(recipients)
+            return len([query for query in queries.captured_queries
+                        if query["sql"].startswith("INSERT")])
+        self.assertEqual(inserts(5), inserts(50))
+
+    def test_compose_query_count(self):
+        """ Recipients are resolved in one query however many there are """
+        def count(number):
+            recipients = [user.email for user in self.users[1:number + 1]]
+            with CaptureQueriesContext(connection) as queries:
+                self.send(recipients)
+            return len(queries.captured_queries)
+        self.assertEqual(count(5), count(50))
+
+    def test_compose_unknown(self):
+        """ Every unknown address is reported and nothing is sent """
+        response = self.send([self.users[1].email, "nobody@example.com", "ghost@example.com"])
+        self.assertEqual(response.status_code, BAD_REQUEST_CODE)
+        self.assertEqual(response.json()["unknown"], ["nobody@example.com", "ghost@example.com"])
+        self.assertFalse(Message.objects.exists())
+
+    def test_compose_to_self(self):
+        """ Sending to yourself puts the message in both folders """
+        self.send([self.sender.email])
+        for mailbox in ("inbox", "sent"):
+            emails = self.client.get(f"/emails/{mailbox}").json()["results"]
+            self.assertEqual(len(emails), 1)
+            self.assertEqual(emails[0]["recipients"], [self.sender.email])
+
+    # Mailbox Testing
+    def test_mailbox(self):
+        """ Each participant sees their own copy and flags """
+        self.send([self.users[1].email, self.users[2].email])
+        reader = Client()
+        reader.force_login(self.users[1])
+
+        inbox = reader.get("/emails/inbox").json()["results"]
+        self.assertEqual(len(inbox), 1)
+        self.assertFalse(inbox[0]["read"])
+        self.assertEqual(inbox[0]["sender"], self.sender.email)
+
+        response = reader.put(f"/emails/{inbox[0]['id']}", json.dumps({"archived": True}))
+        self.assertEqual(response.status_code, NO_CONTENT_CODE)
+        self.assertEqual(reader.get("/emails/inbox").json()["results"], [])
+        self.assertEqual(len(reader.get("/emails/archive").json()["results"]), 1)
+
+        # Nobody else's copy changed
+        other = Client()
+        other.force_login(self.users[2])
+        self.assertEqual(len(other.get("/emails/inbox").json()["results"]), 1)
+        self.assertTrue(self.client.get("/emails/sent").json()["results"][0]["read"])
+        self.assertEqual(reader.get("/emails/junk").status_code, BAD_REQUEST_CODE)
+
+    def test_mailbox_pages(self):
+        """ Cursor pages walk the whole mailbox once, newest first """
+        for idx in range(7):
+            self.send([self.users[1].email, self.users[2].email], subject=f"Email {idx}")
+        reader = Client()
+        reader.force_login(self.users[1])
+
+        seen = []
+        url = "/emails/inbox?limit=3"
+        while url:
+            page = reader.get(url).json()
+            seen += [email["subject"] for email in page["results"]]
+            url = f"/emails/inbox?limit=3&cursor={page['next']}" if page["next"] else None
+        self.assertEqual(seen, [f"Email {idx}" for idx in reversed(range(7))])
+
+        self.assertEqual(reader.get("/emails/inbox?cursor=nope").status_code, BAD_REQUEST_CODE)
+        self.assertEqual(reader.get("/emails/inbox?limit=0").status_code, BAD_REQUEST_CODE)
+
+    def test_mailbox_query_count(self):
+        """ Serializing a page does not query per email """
+        def count():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get("/emails/sent")
+            return len(queries.captured_queries)
+        self.send([self.users[1].email])
+        few = count()
+        for _ in range(10):
+            self.send([self.users[1].email, self.users[2].email])
+        self.assertEqual(count(), few)
+
+    def test_mailbox_summary(self):
+        """ Summary view carries a snippet and never loads the body """
+        self.send([self.users[1].email], subject="Long", body="x" * 5000)
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get("/emails/sent?view=summary").json()
+        email = page["results"][0]
+        self.assertNotIn("body", email)
+        self.assertEqual(email["snippet"], "x" * 100)
+        self.assertEqual(email["recipients"], [self.users[1].email])
+        self.assertNotIn(', "mail_message"."body"', "".join(
+            query["sql"] for query in queries.captured_queries))
+
+        # The whole email is still there by id
+        self.assertEqual(self.client.get(f"/emails/{email['id']}").json()["body"], "x" * 5000)
+        self.assertEqual(self.client.get("/emails/sent?view=bodies").status_code,
+                         BAD_REQUEST_CODE)
+
+    # Bulk Update Testing
+    def test_bulk_update(self):
+        """ One UPDATE over the user's own emails, by ids or by mailbox """
+        for _ in range(5):
+            self.send([self.users[1].email])
+        reader = Client()
+        reader.force_login(self.users[1])
+        ids = [email["id"] for email in reader.get("/emails/inbox").json()["results"]]
+        sent_id = self.client.get("/emails/sent").json()["results"][0]["id"]
+
+        # Someone else's ids are ignored
+        with CaptureQueriesContext(connection) as queries:
+            response = reader.put("/emails/bulk", json.dumps({
+                "ids": ids[:3] + [sent_id],
+                "read": True
+            }))
+        self.assertEqual(response.json(), {"updated": 3})
+        self.assertEqual(len([query for query in queries.captured_queries
+                              if query["sql"].startswith("UPDATE")]), 1)
+
+        response = reader.put("/emails/bulk", json.dumps({"mailbox": "inbox", "archived": True}))
+        self.assertEqual(response.json(), {"updated": 5})
+        self.assertEqual(len(reader.get("/emails/archive").json()["results"]), 5)
+        self.assertEqual(len(self.client.get("/emails/sent").json()["results"]), 5)
+
+        for data in ({"ids": ids}, {"read": True}, {"ids": "1", "read": True},
+                     {"mailbox": "junk", "read": True}, {"ids": ids, "read": "yes"},
+                     {"ids": [True], "read": True},
+                     {"ids": list(range(MAX_BULK_IDS + 1)), "read": True}):
+            response = reader.put("/emails/bulk", json.dumps(data))
+            self.assertEqual(response.status_code, BAD_REQUEST_CODE)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """ Mail Data Migration Test """
+
+    def test_copy_emails(self):
+        """ Per-user Email copies of one send become one Message """
+        executor = MigrationExecutor(connection)
+        latest = executor.loader.graph.leaf_nodes("mail")
+        executor.migrate([("mail", "0001_initial")])
+        apps = executor.loader.project_state([("mail", "0001_initial")]).apps
+        OldUser = apps.get_model("mail", "User")
+        Email = apps.get_model("mail", "Email")
+
+        sender, first, second = [OldUser.objects.create(username=name, email=f"{name}@example.com")
+                                 for name in ("sender", "first", "second")]
+        start = timezone.now()
+        # One send to both recipients, one copy per user, then the same text again later
+        for offset, user in enumerate([sender, first, second]):
+            email = Email.objects.create(user=user, sender=sender, subject="Hi", body="Hello",
+                                         read=user == sender)
+            Email.objects.filter(id=email.id).update(
+                timestamp=start + timedelta(milliseconds=offset))
+            email.recipients.add(first, second)
+        for user in (sender, first):
+            email = Email.objects.create(user=user, sender=sender, subject="Hi", body="Hello")
+            Email.objects.filter(id=email.id).update(timestamp=start + timedelta(hours=1))
+            email.recipients.add(first)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(latest)
+
+        messages = list(Message.objects.order_by("timestamp"))
+        self.assertEqual(len(messages), 2)
+        self.assertEqual({user.username for user in messages[0].recipients.all()},
+                         {"first", "second"})
+        self.assertEqual(messages[0].deliveries.count(), 3)
+        self.assertEqual(messages[1].deliveries.count(), 2)
+        self.assertTrue(Delivery.objects.get(message=messages[0], folder="sent").read)
+        self.assertFalse(Delivery.objects.filter(message=messages[0], folder="inbox",
+                                                 read=True).exists())
@@ -2,15 +2,25 @@
 # pylint: disable=no-member
 
 import json
+import base64
+import binascii
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.http import JsonResponse
 from django.shortcuts import HttpResponse, HttpResponseRedirect, render
 from django.urls import reverse
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 
-from .models import User, Email
+from .models import User, Message, Delivery
+
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+# Ids accepted by one bulk update, a whole mailbox goes by name instead
+MAX_BULK_IDS = 1000
 
 
 def index(request):
@@ -40,63 +50,106 @@ def compose(request):
             "error": "At least one recipient required."
         }, status=400)
 
-    # Convert email addresses to users
-    recipients = []
-    for email in emails:
-        try:
-            user = User.objects.get(email=email)
-            recipients.append(user)
-        except User.DoesNotExist:
-            return JsonResponse({
-                "error": f"User with email {email} does not exist."
-            }, status=400)
+    # Convert email addresses to users, all in one query
+    recipients = set(User.objects.filter(email__in=emails))
+    found = {user.email for user in recipients}
+    unknown = list(dict.fromkeys(email for email in emails if email not in found))
+    if len(unknown) == 1:
+        return JsonResponse({
+            "error": f"User with email {unknown[0]} does not exist.",
+            "unknown": unknown
+        }, status=400)
+    if unknown:
+        return JsonResponse({
+            "error": f"Users with emails {', '.join(unknown)} do not exist.",
+            "unknown": unknown
+        }, status=400)
 
     # Get contents of email
     subject = data.get("subject", "")
     body = data.get("body", "")
 
-    # Create one email for each recipient, plus sender
-    users = set()
-    users.add(request.user)
-    users.update(recipients)
-    for user in users:
-        email = Email(
-            user=user,
-            sender=request.user,
-            subject=subject,
-            body=body,
-            read=user == request.user
-        )
-        email.save()
-        for recipient in recipients:
-            email.recipients.add(recipient)
-        email.save()
+    # Store the message once, then one small delivery row per participant
+    with transaction.atomic():
+        message = Message.objects.create(sender=request.user, subject=subject, body=body)
+        message.recipients.add(*recipients)
+        deliveries = [Delivery(user=request.user, message=message, folder=Delivery.SENT,
+                               read=True, timestamp=message.timestamp)]
+        deliveries += [Delivery(user=user, message=message, folder=Delivery.INBOX,
+                                read=user == request.user, timestamp=message.timestamp)
+                       for user in recipients]
+        Delivery.objects.bulk_create(deliveries)
 
     return JsonResponse({"message": "Email sent successfully."}, status=201)
 
 
+def mailbox_emails(user, mailbox):
+    """ The user's deliveries in mailbox, None for an unknown mailbox """
+    if mailbox == "inbox":
+        return Delivery.objects.filter(user=user, folder=Delivery.INBOX, archived=False)
+    if mailbox == "sent":
+        return Delivery.objects.filter(user=user, folder=Delivery.SENT)
+    if mailbox == "archive":
+        return Delivery.objects.filter(user=user, folder=Delivery.INBOX, archived=True)
+    return None
+
+
 @login_required
 def mailbox(request, mailbox):
 
     # Filter emails returned based on mailbox
-    if mailbox == "inbox":
-        emails = Email.objects.filter(
-            user=request.user, recipients=request.user, archived=False
-        )
-    elif mailbox == "sent":
-        emails = Email.objects.filter(
-            user=request.user, sender=request.user
-        )
-    elif mailbox == "archive":
-        emails = Email.objects.filter(
-            user=request.user, recipients=request.user, archived=True
-        )
-    else:
+    emails = mailbox_emails(request.user, mailbox)
+    if emails is None:
         return JsonResponse({"error": "Invalid mailbox."}, status=400)
 
-    # Return emails in reverse chronologial order
-    emails = emails.order_by("-timestamp").all()
-    return JsonResponse([email.serialize() for email in emails], safe=False)
+    # ?view=summary lists headers and a snippet, bodies come from /emails/<id>
+    view = request.GET.get("view", "full")
+    if view not in ("full", "summary"):
+        return JsonResponse({"error": "view must be full or summary."}, status=400)
+
+    # Page size and where the previous page ended
+    try:
+        limit = min(int(request.GET.get("limit", PAGE_SIZE)), MAX_PAGE_SIZE)
+        after = decode_cursor(request.GET["cursor"]) if request.GET.get("cursor") else None
+    except ValueError as error:
+        return JsonResponse({"error": f"Invalid parameter: {error}"}, status=400)
+    if limit < 1:
+        return JsonResponse({"error": "limit must be positive."}, status=400)
+
+    # Return emails in reverse chronologial order, one page at a time
+    if after is not None:
+        timestamp, last_id = after
+        emails = emails.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=last_id))
+    emails = emails.summaries() if view == "summary" else emails.with_message()
+    emails = list(emails.order_by("-timestamp", "-id")[:limit + 1])
+    after = None
+    if len(emails) > limit:
+        emails = emails[:limit]
+        after = encode_cursor((emails[-1].timestamp, emails[-1].id))
+    return JsonResponse({
+        "results": [email.summarize() if view == "summary" else email.serialize()
+                    for email in emails],
+        "next": after
+    })
+
+
+def encode_cursor(position):
+    """ (timestamp, id) -> opaque URL-safe token """
+    timestamp, last_id = position
+    raw = json.dumps([timestamp.isoformat(), last_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token):
+    """ Opaque token -> (timestamp, id), ValueError if malformed """
+    try:
+        timestamp, last_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        timestamp = parse_datetime(timestamp)
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as error:
+        raise ValueError("Invalid cursor.") from error
+    if timestamp is None or not isinstance(last_id, int):
+        raise ValueError("Invalid cursor.")
+    return timestamp, last_id
 
 
 @csrf_exempt
@@ -105,8 +158,8 @@ def email(request, email_id):
 
     # Query for requested email
     try:
-        email = Email.objects.get(user=request.user, pk=email_id)
-    except Email.DoesNotExist:
+        email = Delivery.objects.get(user=request.user, pk=email_id)
+    except Delivery.DoesNotExist:
         return JsonResponse({"error": "Email not found."}, status=404)
 
     # Return email contents
@@ -120,7 +173,7 @@ def email(request, email_id):
             email.read = data["read"]
         if data.get("archived") is not None:
             email.archived = data["archived"]
-        email.save()
+        email.save(update_fields=["read", "archived"])
         return HttpResponse(status=204)
 
     # Email must be via GET or PUT
@@ -130,6 +183,50 @@ def email(request, email_id):
         }, status=400)
 
 
+@csrf_exempt
+@login_required
+def bulk_update(request):
+    """ Set read and/or archived on many emails with one UPDATE
+    PUT {"ids": [1, 2, 3] or "mailbox": "inbox", "read": true, "archived": false}
+    """
+
+    # Updating must be via PUT
+    if request.method != "PUT":
+        return JsonResponse({"error": "PUT request required."}, status=400)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON."}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Invalid JSON."}, status=400)
+
+    # Flags to set
+    flags = {field: data[field] for field in ("read", "archived") if data.get(field) is not None}
+    if not flags:
+        return JsonResponse({"error": "read or archived required."}, status=400)
+    if not all(isinstance(value, bool) for value in flags.values()):
+        return JsonResponse({"error": "read and archived must be true or false."}, status=400)
+
+    # Which emails, always only the user's own
+    if "ids" in data:
+        ids = data["ids"]
+        if not isinstance(ids, list) or not all(
+                isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            return JsonResponse({"error": "ids must be a list of email ids."}, status=400)
+        if len(ids) > MAX_BULK_IDS:
+            return JsonResponse({"error": f"At most {MAX_BULK_IDS} ids at a time."}, status=400)
+        emails = Delivery.objects.filter(user=request.user, id__in=ids)
+    elif "mailbox" in data:
+        emails = mailbox_emails(request.user, data["mailbox"])
+        if emails is None:
+            return JsonResponse({"error": "Invalid mailbox."}, status=400)
+    else:
+        return JsonResponse({"error": "ids or mailbox required."}, status=400)
+
+    return JsonResponse({"updated": emails.update(**flags)})
+
+
 def login_view(request):
     if request.method == "POST":
 